@@ -0,0 +1,260 @@
+import base64
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import BusinessElement, CacheGeneration, EffectivePermission
+
+GENERATION_NAME = 'access_rules'
+
+# Биты разрешений в скомпилированной маске правила
+PERM_CREATE = 1 << 0
+PERM_READ = 1 << 1
+PERM_READ_ALL = 1 << 2
+PERM_UPDATE = 1 << 3
+PERM_UPDATE_ALL = 1 << 4
+PERM_DELETE = 1 << 5
+PERM_DELETE_ALL = 1 << 6
+
+PERMISSION_BITS = (
+    ('create_permission', PERM_CREATE),
+    ('read_permission', PERM_READ),
+    ('read_all_permission', PERM_READ_ALL),
+    ('update_permission', PERM_UPDATE),
+    ('update_all_permission', PERM_UPDATE_ALL),
+    ('delete_permission', PERM_DELETE),
+    ('delete_all_permission', PERM_DELETE_ALL),
+)
+PERMISSION_FIELDS = tuple(field for field, _ in PERMISSION_BITS)
+
+# Какие биты открывают доступ к HTTP-методу
+METHOD_MASKS = {
+    'GET': PERM_READ | PERM_READ_ALL,
+    'POST': PERM_CREATE,
+    'PUT': PERM_UPDATE | PERM_UPDATE_ALL,
+    'PATCH': PERM_UPDATE | PERM_UPDATE_ALL,
+    'DELETE': PERM_DELETE | PERM_DELETE_ALL,
+}
+
+
+# Действия над отдельным объектом: (действие, бит для своих, бит для всех)
+OBJECT_ACTIONS = (
+    ('read', PERM_READ, PERM_READ_ALL),
+    ('update', PERM_UPDATE, PERM_UPDATE_ALL),
+    ('delete', PERM_DELETE, PERM_DELETE_ALL),
+)
+METHOD_ACTIONS = {
+    'GET': 'read',
+    'HEAD': 'read',
+    'PUT': 'update',
+    'PATCH': 'update',
+    'DELETE': 'delete',
+}
+
+
+def flags_to_mask(flags):
+    # flags — значения *_permission в порядке PERMISSION_BITS
+    mask = 0
+    for flag, (_, bit) in zip(flags, PERMISSION_BITS):
+        if flag:
+            mask |= bit
+    return mask
+
+
+class CompiledRule:
+    # Лёгкая замена AccessRule для request.user_role_rule:
+    # поля *_permission вычисляются из битовой маски
+    __slots__ = ('role_id', 'element_name', 'mask')
+
+    def __init__(self, role_id, element_name, mask):
+        self.role_id = role_id
+        self.element_name = element_name
+        self.mask = mask
+
+    def allows(self, method):
+        return bool(self.mask & METHOD_MASKS.get(method, 0))
+
+    def object_actions(self, is_owner):
+        # Разрешённые действия над своим или чужим объектом; результат
+        # зависит только от маски, поэтому вычисляется один раз на маску
+        key = (self.mask, is_owner)
+        actions = _object_actions.get(key)
+        if actions is None:
+            actions = _object_actions[key] = tuple(
+                action for action, own_bit, all_bit in OBJECT_ACTIONS
+                if self.mask & all_bit or (is_owner and self.mask & own_bit)
+            )
+        return actions
+
+    def owner_sensitive(self):
+        # Отличаются ли действия над своими и чужими объектами
+        return self.object_actions(True) != self.object_actions(False)
+
+
+_object_actions = {}
+
+
+for _field, _bit in PERMISSION_BITS:
+    setattr(CompiledRule, _field, property(lambda self, bit=_bit: bool(self.mask & bit)))
+
+
+class AccessMatrix:
+    # Таблица правил в памяти процесса: role_id -> {element_name: CompiledRule}.
+    # Актуальность сверяется со счётчиком поколений в БД не чаще,
+    # чем раз в ACCESS_MATRIX_CHECK_INTERVAL секунд.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batch = threading.local()
+        self._rules = {}
+        self._elements = frozenset()
+        # Позиция элемента в упакованных масках токена: элементы по возрастанию id
+        self._element_index = {}
+        self._generation = None
+        self._checked_at = 0.0
+
+    @property
+    def generation(self):
+        self._ensure_fresh()
+        return self._generation
+
+    def has_element(self, element_name):
+        self._ensure_fresh()
+        return element_name in self._elements
+
+    def get(self, role_id, element_name):
+        self._ensure_fresh()
+        return self._rules.get(role_id, {}).get(element_name)
+
+    def packed_masks(self, role_id):
+        # Маски всех элементов роли для встраивания в токен
+        self._ensure_fresh()
+        return self._packed_masks(role_id)
+
+    def unpack_mask(self, packed, element_name):
+        # Маска элемента из упакованной строки токена; позиции элементов
+        # совпадают, пока поколение в токене равно текущему
+        index = self._element_index.get(element_name)
+        if index is None:
+            return None
+        try:
+            masks = base64.urlsafe_b64decode(packed + '=' * (-len(packed) % 4))
+        except (TypeError, ValueError):
+            return None
+        return masks[index] if index < len(masks) else 0
+
+    # Асинхронные варианты для ASGI-пути: обновление через async ORM,
+    # сами поиски по таблице не обращаются к БД
+    async def ahas_element(self, element_name):
+        await self._aensure_fresh()
+        return element_name in self._elements
+
+    async def aget(self, role_id, element_name):
+        await self._aensure_fresh()
+        return self._rules.get(role_id, {}).get(element_name)
+
+    async def apacked_masks(self, role_id):
+        await self._aensure_fresh()
+        return self._packed_masks(role_id)
+
+    async def ageneration(self):
+        await self._aensure_fresh()
+        return self._generation
+
+    def invalidate(self):
+        # Следующее обращение перестроит таблицу
+        self._generation = None
+
+    def notify_changed(self):
+        # Внутри batch() изменения копятся и публикуются один раз на выходе
+        if getattr(self._batch, 'depth', 0):
+            self._batch.changed = True
+            return
+        # Сообщаем остальным воркерам через БД, а себя сбрасываем после коммита
+        CacheGeneration.bump(GENERATION_NAME)
+        transaction.on_commit(self.invalidate)
+
+    @contextmanager
+    def batch(self):
+        # Массовые изменения правил: одна инвалидация вместо одной на строку
+        state = self._batch
+        state.depth = getattr(state, 'depth', 0) + 1
+        if state.depth == 1:
+            state.changed = False
+        try:
+            yield
+        finally:
+            state.depth -= 1
+        if state.depth == 0 and state.changed:
+            self.notify_changed()
+
+    def _packed_masks(self, role_id):
+        # Байт на элемент (7 бит маски), позиция — из _element_index;
+        # нулевые байты в конце отбрасываются, результат — base64url без '='
+        masks = bytearray(len(self._element_index))
+        for name, rule in self._rules.get(role_id, {}).items():
+            index = self._element_index.get(name)
+            if index is not None:
+                masks[index] = rule.mask
+        return base64.urlsafe_b64encode(bytes(masks).rstrip(b'\0')).rstrip(b'=').decode('ascii')
+
+    def _is_fresh(self):
+        interval = getattr(settings, 'ACCESS_MATRIX_CHECK_INTERVAL', 5)
+        return self._generation is not None and time.monotonic() - self._checked_at < interval
+
+    def _ensure_fresh(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            # Поколение читаем до правил: если правила изменятся между запросами,
+            # следующая проверка увидит новое поколение и перестроит таблицу
+            generation = CacheGeneration.current(GENERATION_NAME)
+            if generation != self._generation:
+                self._load()
+            self._generation = generation
+            self._checked_at = time.monotonic()
+
+    async def _aensure_fresh(self):
+        # threading.Lock нельзя держать через await; параллельное обновление
+        # из нескольких корутин лишь повторит одну и ту же загрузку
+        if self._is_fresh():
+            return
+        generation = await CacheGeneration.acurrent(GENERATION_NAME)
+        if generation != self._generation:
+            rules = {}
+            async for row in self._rules_query():
+                self._add_rule(rules, row)
+            self._set_elements([name async for name in self._elements_query()])
+            self._rules = rules
+        self._generation = generation
+        self._checked_at = time.monotonic()
+
+    def _rules_query(self):
+        # Права с учётом иерархии ролей (см. accounts.role_hierarchy)
+        return EffectivePermission.objects.values_list('role_id', 'business_element__name', *PERMISSION_FIELDS)
+
+    def _elements_query(self):
+        return BusinessElement.objects.order_by('id').values_list('name', flat=True)
+
+    def _set_elements(self, names):
+        self._element_index = {name: index for index, name in enumerate(names)}
+        self._elements = frozenset(names)
+
+    def _add_rule(self, rules, row):
+        role_id, element_name, *flags = row
+        rules.setdefault(role_id, {})[element_name] = CompiledRule(role_id, element_name, flags_to_mask(flags))
+
+    def _load(self):
+        rules = {}
+        for row in self._rules_query():
+            self._add_rule(rules, row)
+        self._set_elements(list(self._elements_query()))
+        self._rules = rules
+
+
+access_matrix = AccessMatrix()
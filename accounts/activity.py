@@ -0,0 +1,81 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .background import PeriodicTask
+from .cache import TTLCache
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    # last_login / last_seen без записи на каждый запрос. Отметка — это
+    # запись в словарь воркера; фоновый поток раз в ACTIVITY_FLUSH_INTERVAL
+    # секунд сохраняет накопленное через bulk_update (один UPDATE ... CASE
+    # на пачку). Повторные отметки пользователя в течение
+    # ACTIVITY_WRITE_INTERVAL секунд отбрасываются, поэтому строка
+    # обновляется не чаще одного раза за интервал в каждом воркере.
+
+    def __init__(self):
+        self.write_interval = getattr(settings, 'ACTIVITY_WRITE_INTERVAL', 300)
+        self._recent = TTLCache(getattr(settings, 'ACTIVITY_MAX_USERS', 100000), self.write_interval)
+        self._seen = {}
+        self._logins = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._writer = PeriodicTask(
+            'activity-writer', getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 60), self.flush
+        )
+        atexit.register(self._flush_at_exit)
+
+    def touch(self, user_id):
+        if self._recent.get(user_id) is not None:
+            return
+        self._recent.set(user_id, True)
+        self._writer.ensure_started()
+        with self._lock:
+            self._seen[user_id] = timezone.now()
+
+    def login(self, user_id):
+        # Вход записывается всегда, даже если пользователь недавно был активен
+        self._recent.set(user_id, True)
+        self._writer.ensure_started()
+        with self._lock:
+            self._logins[user_id] = timezone.now()
+            self._seen.pop(user_id, None)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                seen, self._seen = self._seen, {}
+                logins, self._logins = self._logins, {}
+            batch_size = getattr(settings, 'ACTIVITY_BATCH_SIZE', 1000)
+            # bulk_update не вызывает сигналы и не трогает updated_at
+            if logins:
+                User.objects.bulk_update(
+                    [User(id=user_id, last_login=moment, last_seen=moment) for user_id, moment in logins.items()],
+                    ['last_login', 'last_seen'], batch_size=batch_size,
+                )
+            if seen:
+                User.objects.bulk_update(
+                    [User(id=user_id, last_seen=moment) for user_id, moment in seen.items()],
+                    ['last_seen'], batch_size=batch_size,
+                )
+
+    def _flush_at_exit(self):
+        if not self._seen and not self._logins:
+            return
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось сохранить активность пользователей при завершении')
+
+    def stats(self):
+        return {'pending': len(self._seen) + len(self._logins)}
+
+
+activity = ActivityTracker()
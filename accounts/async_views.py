@@ -0,0 +1,152 @@
+import json
+import math
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, ParseError
+
+from .activity import activity
+from .audit import LOGIN_FAILED, LOGIN_SUCCEEDED, audit_log
+from .authentication import JWTAuthentication
+from .models import User, Role
+from .serializers import UserSerializer
+from . import user_cache
+from .db_router import astick_to_primary
+from .refresh_tokens import atoken_pair
+from .throttling import LoginRateThrottle
+
+# Нативные async-представления для ASGI-развёртывания. DRF не поддерживает
+# async-представления, поэтому аутентификация, проверка прав и обработка
+# ошибок повторяют поведение @api_view вручную, без перехода в sync-поток.
+
+_authenticator = JWTAuthentication()
+
+
+def _error_response(exc):
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = JsonResponse(detail, status=exc.status_code, safe=False)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = _authenticator.authenticate_header(None)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = str(math.ceil(exc.wait))
+    return response
+
+
+def _parse_body(request):
+    if not request.body:
+        return {}
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        raise ParseError('Некорректный JSON в теле запроса.')
+
+
+def async_api_view(methods, permission_class=None, authenticated=False, throttle_class=None):
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Метод "{request.method}" не разрешен.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+            try:
+                request.data = _parse_body(request)
+                auth = await _authenticator.aauthenticate(request)
+                request.user, request.auth = auth if auth else (None, None)
+
+                if (authenticated or permission_class) and request.user is None:
+                    raise NotAuthenticated('Учетные данные не были предоставлены.')
+                if permission_class is not None:
+                    await permission_class().ahas_permission(request, view)
+                if throttle_class is not None:
+                    await throttle_class().aallow_request(request, view)
+
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return _error_response(exc)
+        return wrapper
+    return decorator
+
+
+@async_api_view(['POST'])
+async def register_view(request):
+    data = request.data
+    email = data.get('email')
+    password = data.get('password')
+
+    if password != data.get('password_confirm'):
+        return JsonResponse({'error': 'Пароли не совпадают'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if await User.objects.filter(email=email).aexists():
+        return JsonResponse({'error': 'Пользователь с таким email уже существует'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        default_role = await Role.objects.aget(name='user')
+    except Role.DoesNotExist:
+        return JsonResponse({'error': 'Роль "user" не найдена в базе данных'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    user = User(
+        first_name=data.get('first_name'),
+        last_name=data.get('last_name', ''),
+        patronymic=data.get('patronymic', ''),
+        email=email,
+        role=default_role,
+    )
+    # bcrypt ожидается в пуле хеширования, event loop при этом свободен
+    await user.aset_password(password)
+    await user.asave()
+    # Новый пользователь может ещё не дойти до реплик
+    await astick_to_primary(user.id)
+    activity.login(user.id)
+
+    return JsonResponse(await atoken_pair(user), status=status.HTTP_201_CREATED)
+
+
+@async_api_view(['POST'], throttle_class=LoginRateThrottle)
+async def login_view(request):
+    email = request.data.get('email')
+    password = request.data.get('password')
+
+    try:
+        user = await User.objects.select_related('role').aget(email=email, is_active=True)
+    except User.DoesNotExist:
+        audit_log.record(LOGIN_FAILED, request, email=email, reason='unknown_user')
+        return JsonResponse({'error': 'Неверный email или пароль'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    if not await user.acheck_password(password):
+        audit_log.record(LOGIN_FAILED, request, user_id=user.id, email=email, reason='bad_password')
+        return JsonResponse({'error': 'Неверный email или пароль'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    audit_log.record(LOGIN_SUCCEEDED, request, user_id=user.id, email=email)
+    activity.login(user.id)
+    return JsonResponse(await atoken_pair(user), status=status.HTTP_200_OK)
+
+
+@async_api_view(['GET', 'PUT', 'DELETE'], authenticated=True)
+async def profile_view(request):
+    # Роль загружается тем же запросом, поэтому сериализатор не обращается к БД
+    try:
+        user = await request.user.aget_full_user()
+    except User.DoesNotExist:
+        return JsonResponse({'error': 'Пользователь не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        return JsonResponse(UserSerializer(user).data)
+
+    elif request.method == 'PUT':
+        user.first_name = request.data.get('first_name', user.first_name)
+        user.last_name = request.data.get('last_name', user.last_name)
+        user.patronymic = request.data.get('patronymic', user.patronymic)
+        await user.asave()
+        user_cache.forget(user.id)
+        return JsonResponse(UserSerializer(user).data)
+
+    elif request.method == 'DELETE':
+        user.is_active = False
+        await user.asave()
+        user_cache.forget(user.id)
+        return JsonResponse({'message': 'Аккаунт удален'}, status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .background import PeriodicTask
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+LOGIN_SUCCEEDED = 'login_succeeded'
+LOGIN_FAILED = 'login_failed'
+PERMISSION_DENIED = 'permission_denied'
+ACCESS_RULE_CHANGED = 'access_rule_changed'
+
+
+class AuditLog:
+    # Запись события — только постановка в ограниченную очередь воркера.
+    # Фоновый поток сбрасывает очередь одним bulk_create раз в
+    # AUDIT_FLUSH_INTERVAL секунд или как только накопится AUDIT_BATCH_SIZE
+    # событий. При переполнении событие отбрасывается и учитывается в dropped.
+
+    def __init__(self):
+        self.batch_size = getattr(settings, 'AUDIT_BATCH_SIZE', 500)
+        self._queue = queue.Queue(maxsize=getattr(settings, 'AUDIT_QUEUE_SIZE', 10000))
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._writer = PeriodicTask('audit-writer', getattr(settings, 'AUDIT_FLUSH_INTERVAL', 2), self.flush)
+        atexit.register(self._flush_at_exit)
+
+    def record(self, event, request=None, user_id=None, email='', **details):
+        self._writer.ensure_started()
+        item = AuditEvent(
+            created_at=timezone.now(),
+            event=event,
+            user_id=user_id,
+            email=str(email or '')[:254],
+            ip=request.META.get('REMOTE_ADDR') if request is not None else None,
+            method=request.method if request is not None else '',
+            path=request.path[:255] if request is not None else '',
+            details=details,
+        )
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._writer.wake()
+
+    def flush(self):
+        # Сбрасывает всё, что накопилось к моменту вызова, пачками по batch_size
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                try:
+                    AuditEvent.objects.bulk_create(batch)
+                except Exception:
+                    with self._lock:
+                        self.failed += len(batch)
+                    raise
+                with self._lock:
+                    self.written += len(batch)
+                if len(batch) < self.batch_size:
+                    return
+
+    def _flush_at_exit(self):
+        if self._queue.empty():
+            return
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось записать журнал аудита при завершении')
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+audit_log = AuditLog()
@@ -1,11 +1,63 @@
-import os
+from django.conf import settings
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from .models import User
+from . import metrics, user_cache
+from .activity import activity
+from .revocation import revocations
+from .user_cache import UserSnapshot
+from .tokens import decode_token
 import jwt
 
 class JWTAuthentication(BaseAuthentication):
+    @metrics.instrumented('authenticate')
     def authenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+
+        payload = self.get_payload(token)
+
+        # Обычно ответ «не отозван» даёт набор в памяти, без запроса к БД
+        if revocations.is_revoked(payload.get('jti')):
+            raise AuthenticationFailed('Токен отозван.')
+
+        user = self.user_from_claims(payload)
+        if user is None:
+            # Находим пользователя: сначала в кэше процесса, затем в базе
+            user = user_cache.get_active_user(payload['user_id'])
+        if user is None:
+            # Пользователь не найден или неактивен
+            raise AuthenticationFailed('Пользователь не найден или неактивен.')
+
+        # last_seen: отметка в памяти, запись в БД — пачкой из фонового потока
+        activity.touch(user.id)
+        # Проверенный payload для представлений и проверок прав: повторное
+        # декодирование могло бы упасть, если токен истёк в ходе запроса
+        request.jwt_payload = payload
+        return (user, token)
+
+    async def aauthenticate(self, request):
+        # То же самое для async-представлений: пользователь читается через async ORM
+        token = self.get_token(request)
+        if token is None:
+            return None
+
+        payload = self.get_payload(token)
+
+        if await revocations.ais_revoked(payload.get('jti')):
+            raise AuthenticationFailed('Токен отозван.')
+
+        user = self.user_from_claims(payload)
+        if user is None:
+            user = await user_cache.aget_active_user(payload['user_id'])
+        if user is None:
+            raise AuthenticationFailed('Пользователь не найден или неактивен.')
+
+        activity.touch(user.id)
+        request.jwt_payload = payload
+        return (user, token)
+
+    def get_token(self, request):
         auth_header = request.META.get('HTTP_AUTHORIZATION')
 
         if not auth_header or not auth_header.startswith('Bearer '):
@@ -13,11 +65,12 @@ class JWTAuthentication(BaseAuthentication):
             # аутентификация не проходит, возвращаем None
             return None
 
-        token = auth_header.split(' ')[1]
+        return auth_header.split(' ')[1]
 
+    def get_payload(self, token):
         try:
-            # Декодируем токен
-            payload = jwt.decode(token, os.getenv('SECRET_KEY'), algorithms=['HS256'])
+            # Декодируем токен (повторно предъявленный берётся из кэша проверенных)
+            payload = decode_token(token)
         except jwt.ExpiredSignatureError:
             # Токен просрочен
             raise AuthenticationFailed('Токен недействителен или просрочен.')
@@ -25,20 +78,19 @@ class JWTAuthentication(BaseAuthentication):
             # Токен неправильный
             raise AuthenticationFailed('Токен недействителен.')
 
-        user_id = payload.get('user_id')
-
-        if user_id is None:
+        if payload.get('user_id') is None:
             # В токене нет user_id — некорректный токен
             raise AuthenticationFailed('Токен недействителен.')
 
-        try:
-            # Находим пользователя в базе
-            user = User.objects.get(id=user_id, is_active=True)
-        except User.DoesNotExist:
-            # Пользователь не найден или неактивен
-            raise AuthenticationFailed('Пользователь не найден или неактивен.')
+        return payload
 
-        return (user, token)
+    def user_from_claims(self, payload):
+        # При коротком TTL access-токена его содержимому можно доверять без
+        # проверки активности в БД: деактивация вступит в силу по истечении
+        # токена, а refresh для неактивного пользователя не выдаётся
+        if not settings.JWT_STATELESS_ACCESS or 'role' not in payload or 'rn' not in payload:
+            return None
+        return UserSnapshot(payload['user_id'], True, payload['role'], payload['rn'])
 
     def authenticate_header(self, request):
-        return 'Bearer'
\ No newline at end of file
+        return 'Bearer'
@@ -0,0 +1,61 @@
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    # Фоновая задача воркера: вызывает func раз в interval секунд в daemon-потоке.
+    # Поток запускается лениво из кода запроса, а не при импорте, поэтому
+    # management-команды его не создают, а после fork (gunicorn --preload)
+    # каждый воркер запускает собственный поток.
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._wake = threading.Event()
+            thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def wake(self):
+        # Выполнить задачу сейчас, не дожидаясь интервала
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._pid = None
+
+    def run_once(self):
+        try:
+            self.func()
+        except Exception:
+            logger.exception('Фоновая задача %s завершилась с ошибкой', self.name)
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        stop, wake = self._stop, self._wake
+        while True:
+            wake.wait(self.interval)
+            wake.clear()
+            if stop.is_set():
+                return
+            self.run_once()
@@ -0,0 +1,75 @@
+import math
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Общие функции для команд-бенчмарков: латентности передаются в секундах,
+# в отчёт попадают в миллисекундах
+
+
+def percentile(sorted_samples, fraction):
+    # Метод ближайшего ранга: без интерполяции, как в большинстве нагрузочных утилит
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(latencies, elapsed):
+    samples = sorted(latencies)
+    count = len(samples)
+    return {
+        'count': count,
+        'ops_per_sec': round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        'mean_ms': round(sum(samples) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+    }
+
+
+def split_evenly(total, parts):
+    # Распределяет total операций по parts исполнителям
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts) if base or i < extra]
+
+
+def measure(func, iterations, warmup=10):
+    # Прогрев, затем замер каждой операции отдельно
+    for _ in range(warmup):
+        func()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies, time.perf_counter() - started
+
+
+def queries_per_op(func, iterations=10):
+    # Отдельный короткий проход: сбор SQL замедляет операции и исказил бы латентность
+    with CaptureQueriesContext(connection) as context:
+        for _ in range(iterations):
+            func()
+    return round(len(context) / iterations, 2)
+
+
+def find_regressions(current, baseline, threshold):
+    # Сравнение двух JSON-отчётов: падение ops/sec, рост p99 или числа запросов
+    regressions = []
+    baseline_by_name = {result['name']: result for result in baseline}
+    for result in current:
+        previous = baseline_by_name.get(result['name'])
+        if previous is None:
+            continue
+        if result['ops_per_sec'] < previous['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{result['name']}: ops/sec {previous['ops_per_sec']} -> {result['ops_per_sec']}")
+        if result['p99_ms'] > previous['p99_ms'] * (1 + threshold):
+            regressions.append(f"{result['name']}: p99 {previous['p99_ms']} ms -> {result['p99_ms']} ms")
+        if result['queries_per_op'] > previous['queries_per_op']:
+            regressions.append(
+                f"{result['name']}: запросов на операцию {previous['queries_per_op']} -> {result['queries_per_op']}"
+            )
+    return regressions
@@ -0,0 +1,140 @@
+import random
+from contextvars import ContextVar
+
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .tokens import decode_token
+
+REPLICAS = tuple(getattr(settings, 'DATABASE_REPLICAS', ()))
+STICKY_KEY = 'db-primary:{}'
+
+
+class RoutingState:
+    # Изменяемый объект, а не отдельные значения ContextVar: пометка о записи,
+    # сделанная в потоке sync_to_async, видна и в исходном контексте
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+def _current_state():
+    state = _state.get()
+    if state is None:
+        # Вне запроса (команды, фоновые потоки) состояние живёт в своём контексте
+        state = RoutingState()
+        _state.set(state)
+    return state
+
+
+def _sticky_cache():
+    return caches[getattr(settings, 'DB_PRIMARY_STICKY_CACHE', 'default')]
+
+
+def stick_to_primary(user_id):
+    # Следующие запросы пользователя в течение окна читают с основной БД,
+    # чтобы не увидеть устаревшие данные из отстающей реплики
+    if REPLICAS and user_id is not None:
+        _sticky_cache().set(STICKY_KEY.format(user_id), 1, settings.DB_PRIMARY_STICKY_SECONDS)
+
+
+async def astick_to_primary(user_id):
+    if REPLICAS and user_id is not None:
+        await _sticky_cache().aset(STICKY_KEY.format(user_id), 1, settings.DB_PRIMARY_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    # Запись — всегда в default. Чтение — со случайной реплики, кроме случаев,
+    # когда нужна основная БД: открыта транзакция (select_for_update и
+    # чтение-после-записи внутри atomic), в этом запросе уже была запись
+    # или пользователь недавно что-то изменил (см. stick_to_primary)
+
+    def db_for_read(self, model, **hints):
+        if not REPLICAS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return DEFAULT_DB_ALIAS
+        return random.choice(REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if REPLICAS:
+            _current_state().wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему через репликацию
+        if db in REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    # Определяет по access-токену (проверенные токены берутся из кэша),
+    # нужно ли запросу читать с основной БД, и после запроса с записью
+    # закрепляет пользователя за основной БД на DB_PRIMARY_STICKY_SECONDS.
+    # Без реплик Django исключает middleware из конвейера.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not REPLICAS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        user_id = self.token_user_id(request)
+        pinned = user_id is not None and _sticky_cache().get(STICKY_KEY.format(user_id)) is not None
+        state = RoutingState(pinned)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            stick_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        user_id = self.token_user_id(request)
+        pinned = user_id is not None and await _sticky_cache().aget(STICKY_KEY.format(user_id)) is not None
+        state = RoutingState(pinned)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            await astick_to_primary(user_id)
+        return response
+
+    @staticmethod
+    def token_user_id(request):
+        header = request.headers.get('Authorization', '')
+        if not header.startswith('Bearer '):
+            return None
+        try:
+            return decode_token(header[len('Bearer '):]).get('user_id')
+        except jwt.InvalidTokenError:
+            # Невалидный токен отклонит JWTAuthentication
+            return None
@@ -0,0 +1,66 @@
+from rest_framework.filters import BaseFilterBackend
+
+# Право *_all снимает ограничение по владельцу для соответствующего метода
+ALL_PERMISSIONS = {
+    'GET': 'read_all_permission',
+    'HEAD': 'read_all_permission',
+    'PUT': 'update_all_permission',
+    'PATCH': 'update_all_permission',
+    'DELETE': 'delete_all_permission',
+}
+
+
+def scope_to_owner(request, queryset, owner_field='owner_id'):
+    # Превращает правило из AccessPermission (request.user_role_rule) в условие
+    # WHERE owner_id = <id пользователя>, чтобы выборка шла по индексу в БД,
+    # а не фильтровалась в Python
+    rule = getattr(request, 'user_role_rule', None)
+    if rule is None:
+        return queryset.none()
+
+    all_permission = ALL_PERMISSIONS.get(request.method)
+    if all_permission and getattr(rule, all_permission):
+        return queryset
+    return queryset.filter(**{owner_field: request.user.id})
+
+
+class OwnerScopedFilterBackend(BaseFilterBackend):
+    # Для generic-представлений: filter_backends = [OwnerScopedFilterBackend],
+    # поле владельца задаётся атрибутом owner_field представления
+    def filter_queryset(self, request, queryset, view):
+        owner_field = getattr(view, 'owner_field', 'owner_id')
+        return scope_to_owner(request, queryset, owner_field)
+
+
+# Диапазон bigint: большие числа из query-параметров БД не примет (500)
+MIN_ID = -2 ** 63
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_id(value):
+    # Целое из query-параметра в пределах bigint, иначе ValueError
+    number = int(value)
+    if not MIN_ID <= number <= MAX_ID:
+        raise ValueError(value)
+    return number
+
+
+def keyset_params(request, default_limit, max_limit):
+    # limit и курсор after (id последней строки предыдущей страницы) из
+    # query-параметров. ValueError содержит текст для ответа 400
+    try:
+        limit = min(int(request.query_params.get('limit', default_limit)), max_limit)
+        after = parse_id(request.query_params.get('after', 0))
+    except ValueError:
+        raise ValueError('limit и after должны быть целыми числами')
+    if limit < 1:
+        raise ValueError('limit должен быть положительным')
+    return limit, after
+
+
+def next_page_link(request, after, limit):
+    # Значение заголовка Link на следующую страницу
+    params = request.query_params.copy()
+    params['after'] = after
+    params['limit'] = limit
+    return f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
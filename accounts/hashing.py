@@ -0,0 +1,97 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервис временно перегружен, повторите попытку позже.'
+    default_code = 'hashing_unavailable'
+
+
+# Непосредственные вызовы bcrypt: выполняются в пуле, а также в процессах
+# массового импорта пользователей
+def bcrypt_hash(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def bcrypt_check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+class HashingExecutor:
+    # Отдельный пул для bcrypt. bcrypt отпускает GIL, поэтому потоки пула
+    # работают параллельно на разных ядрах. Семафор ограничивает число
+    # выполняющихся и ожидающих задач: сверх лимита запрос сразу получает 503,
+    # а не занимает воркер в очереди.
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Пул создаётся при первом использовании, чтобы не плодить потоки
+        # в процессах, которые не хешируют пароли (например, manage.py migrate)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='password-hashing'
+                    )
+        return self._executor
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingUnavailable()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'rejected': self.rejected,
+        }
+
+
+executor = HashingExecutor(
+    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 4),
+    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 16),
+)
+
+
+def hash_password(password):
+    return executor.run(bcrypt_hash, password)
+
+
+def check_password(password, password_hash):
+    return executor.run(bcrypt_check, password, password_hash)
+
+
+async def ahash_password(password):
+    return await executor.arun(bcrypt_hash, password)
+
+
+async def acheck_password(password, password_hash):
+    return await executor.arun(bcrypt_check, password, password_hash)
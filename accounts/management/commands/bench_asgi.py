@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from accounts.benchmarking import split_evenly, summarize
+
+# Сценарии: один и тот же аутентифицированный GET профиля через WSGI,
+# через ASGI с sync-представлением (переход в поток) и через ASGI с async-представлением
+SCENARIOS = (
+    ('wsgi', 'sync', '/api/auth/profile/'),
+    ('asgi', 'sync', '/api/auth/profile/'),
+    ('asgi', 'async', '/api/auth/async/profile/'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнение RPS и p99 для WSGI- и ASGI-пути на одном и том же оборудовании.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help='Пользователь, от имени которого идут запросы')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--requests', type=int, default=500, help='Запросов на сценарий')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        # Тестовые клиенты ходят с хостом testserver
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            token = self._login(options['email'], options['password'])
+            headers = {'Authorization': f'Bearer {token}'}
+
+            results = []
+            for handler, view, path in SCENARIOS:
+                run = self._run_wsgi if handler == 'wsgi' else self._run_asgi
+                run(path, headers, options['warmup'], 1)
+                latencies, elapsed = run(path, headers, options['requests'], options['concurrency'])
+                results.append({'handler': handler, 'view': view, 'path': path, **summarize(latencies, elapsed)})
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(
+                f"{result['handler']:<5} {result['view']:<6} "
+                f"{result['ops_per_sec']:>9.1f} req/s  "
+                f"p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms"
+            )
+
+    def _login(self, email, password):
+        response = Client().post(
+            '/api/auth/login/', {'email': email, 'password': password}, content_type='application/json'
+        )
+        if response.status_code != 200:
+            raise CommandError(f'Не удалось войти: {response.status_code} {response.content!r}')
+        return response.json()['token']
+
+    def _run_wsgi(self, path, headers, total, concurrency):
+        def worker(count):
+            client = Client()
+            samples = []
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = client.get(path, headers=headers)
+                    samples.append(time.perf_counter() - start)
+                    self._check(response, path)
+            finally:
+                connections.close_all()
+            return samples
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            chunks = list(pool.map(worker, split_evenly(total, concurrency)))
+        elapsed = time.perf_counter() - start
+        return [sample for chunk in chunks for sample in chunk], elapsed
+
+    def _run_asgi(self, path, headers, total, concurrency):
+        async def run():
+            client = AsyncClient()
+            samples = []
+
+            async def worker(count):
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = await client.get(path, headers=headers)
+                    samples.append(time.perf_counter() - start)
+                    self._check(response, path)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(count) for count in split_evenly(total, concurrency)))
+            return samples, time.perf_counter() - start
+
+        return asyncio.run(run())
+
+    def _check(self, response, path):
+        if response.status_code != 200:
+            raise CommandError(f'{path} ответил {response.status_code}: {response.content!r}')
@@ -0,0 +1,115 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from accounts import tokens, user_cache
+from accounts.authentication import JWTAuthentication
+from accounts.benchmarking import find_regressions, measure, queries_per_op, summarize
+from accounts.models import AccessRule, User
+from accounts.permissions import AccessPermissionForProducts
+from accounts.serializers import AccessRuleSerializer, UserSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарки горячих путей аутентификации и авторизации: ops/sec, '
+        'p50/p95/p99 и число SQL-запросов на операцию, с JSON-отчётом для сравнения релизов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Пользователь для замеров (по умолчанию — первый активный)')
+        parser.add_argument('--password', help='Пароль пользователя; без него check_password пропускается')
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--password-iterations', type=int, default=20,
+                            help='Итераций для check_password (bcrypt медленный)')
+        parser.add_argument('--output', help='Сохранить отчёт в JSON-файл')
+        parser.add_argument('--compare', help='JSON-отчёт предыдущего запуска для поиска регрессий')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Допустимое ухудшение ops/sec и p99, доля (0.1 = 10%%)')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['email'])
+        token = user.generate_jwt()
+        factory = APIRequestFactory()
+        authenticator = JWTAuthentication()
+
+        def make_request():
+            return Request(
+                factory.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}'),
+                authenticators=[authenticator],
+            )
+
+        auth_request = make_request()
+        permission_request = make_request()
+        permission_request.user  # аутентифицируем один раз, замеряем только проверку прав
+        permission = AccessPermissionForProducts()
+
+        def serialize_rules():
+            # Выборка внутри замера и с тем же select_related, что в списке
+            # правил: иначе кэш внешних ключей после прогрева скрыл бы N+1
+            rules = AccessRule.objects.select_related('role', 'business_element').order_by('id')[:100]
+            return AccessRuleSerializer(rules, many=True).data
+
+        def authenticate_cold():
+            tokens.clear()
+            user_cache.clear()
+            authenticator.authenticate(auth_request)
+
+        iterations = options['iterations']
+        cases = [
+            ('authenticate', lambda: authenticator.authenticate(auth_request), iterations),
+            ('authenticate_cold', authenticate_cold, iterations),
+            ('has_permission', lambda: permission.has_permission(permission_request, None), iterations),
+            ('generate_jwt', user.generate_jwt, iterations),
+            ('user_serializer', lambda: UserSerializer(user).data, iterations),
+            ('access_rule_serializer', serialize_rules, max(1, iterations // 10)),
+        ]
+        if options['password']:
+            if not user.check_password(options['password']):
+                raise CommandError('Неверный пароль для выбранного пользователя')
+            password = options['password']
+            cases.append(('check_password', lambda: user.check_password(password), options['password_iterations']))
+
+        results = []
+        for name, func, count in cases:
+            latencies, elapsed = measure(func, count, warmup=min(10, count))
+            results.append({
+                'name': name,
+                **summarize(latencies, elapsed),
+                'queries_per_op': queries_per_op(func, iterations=min(10, count)),
+            })
+            self.stdout.write(self._format(results[-1]))
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(results, stream, indent=2, ensure_ascii=False)
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                baseline = json.load(stream)
+            regressions = find_regressions(results, baseline, options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(f'Регрессия: {regression}'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('Регрессий не найдено'))
+            elif options['fail_on_regression']:
+                raise CommandError(f'Найдено регрессий: {len(regressions)}')
+
+    def _get_user(self, email):
+        users = User.objects.select_related('role').filter(is_active=True)
+        if email:
+            users = users.filter(email=email)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('Активный пользователь не найден')
+        return user
+
+    def _format(self, result):
+        return (
+            f"{result['name']:<24} {result['ops_per_sec']:>12.1f} ops/s  "
+            f"p50 {result['p50_ms']:.3f} ms  p95 {result['p95_ms']:.3f} ms  "
+            f"p99 {result['p99_ms']:.3f} ms  запросов/оп {result['queries_per_op']}"
+        )
@@ -0,0 +1,97 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from accounts.benchmarking import measure, summarize
+from accounts.models import User
+
+PROFILES = ('auth_system.settings', 'auth_system.settings_production')
+PATH = '/api/auth/profile/'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение профилей настроек: время холодного старта (новый процесс до '
+        'первого ответа) и накладные расходы на запрос.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help='Пользователь, от имени которого идут запросы')
+        parser.add_argument('--settings-modules', nargs='+', default=list(PROFILES), metavar='MODULE')
+        parser.add_argument('--cold-runs', type=int, default=5, help='Запусков процесса на профиль')
+        parser.add_argument('--requests', type=int, default=1000, help='Запросов на профиль')
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+        # Внутренний режим: замер внутри процесса с нужным DJANGO_SETTINGS_MODULE
+        parser.add_argument('--child', choices=['cold', 'requests'], help='Служебный режим')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self._child(options)
+            return
+
+        results = []
+        for module in options['settings_modules']:
+            cold = [self._spawn(module, 'cold', options)[1] for _ in range(options['cold_runs'])]
+            output, _ = self._spawn(module, 'requests', options)
+            results.append({
+                'settings': module,
+                'cold_start_ms': round(statistics.median(cold) * 1000, 1),
+                **json.loads(output),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(
+                f"{result['settings']:<34} cold start {result['cold_start_ms']:>7.1f} ms  "
+                f"{result['ops_per_sec']:>9.1f} req/s  "
+                f"p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms"
+            )
+
+    def _spawn(self, module, mode, options):
+        # Каждый профиль — в отдельном процессе: настройки Django нельзя
+        # сменить после django.setup()
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_settings',
+            '--child', mode, '--email', options['email'],
+            '--requests', str(options['requests']), '--warmup', str(options['warmup']),
+        ]
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': module}
+        start = time.perf_counter()
+        process = subprocess.run(command, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        if process.returncode != 0:
+            raise CommandError(f'{module}: {process.stderr.strip()}')
+        return process.stdout, elapsed
+
+    def _child(self, options):
+        try:
+            user = User.objects.select_related('role').get(email=options['email'], is_active=True)
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {options['email']} не найден")
+        headers = {'Authorization': f'Bearer {user.generate_jwt()}'}
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            client = Client()
+
+            def request():
+                response = client.get(PATH, headers=headers)
+                if response.status_code != 200:
+                    raise CommandError(f'{PATH} ответил {response.status_code}: {response.content!r}')
+
+            if options['child'] == 'cold':
+                request()
+                return
+            latencies, elapsed = measure(request, options['requests'], options['warmup'])
+        self.stdout.write(json.dumps(summarize(latencies, elapsed)))
@@ -0,0 +1,140 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts import role_hierarchy
+from accounts.access_matrix import PERMISSION_FIELDS, access_matrix
+from accounts.hashing import bcrypt_hash
+from accounts.models import AccessRule, BusinessElement, Role, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация синтетических данных для нагрузочного тестирования: '
+        'N пользователей, R ролей, E бизнес-элементов и правила с заданной плотностью.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--roles', type=int, default=10)
+        parser.add_argument('--elements', type=int, default=100)
+        parser.add_argument('--rule-density', type=float, default=0.3,
+                            help='Доля пар (роль, элемент), для которых создаётся правило, от 0 до 1')
+        parser.add_argument('--seed', type=int, default=42, help='Одинаковый seed даёт одинаковые данные')
+        parser.add_argument('--prefix', default='load', help='Префикс имён, чтобы не пересекаться с рабочими данными')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--shared-password', action='store_true',
+                            help='Захешировать пароль один раз и использовать хеш для всех пользователей')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Процессов для bcrypt без --shared-password')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['rule_density'] <= 1:
+            raise CommandError('--rule-density должен быть в диапазоне от 0 до 1')
+        if options['users'] > 0 and options['roles'] < 1:
+            raise CommandError('Для пользователей нужна хотя бы одна роль: --roles должен быть не меньше 1')
+
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        started = time.perf_counter()
+
+        role_ids = self._create_named(Role, [f'{prefix}_role_{i:04d}' for i in range(options['roles'])])
+        element_ids = self._create_named(
+            BusinessElement, [f'{prefix}_element_{i:04d}' for i in range(options['elements'])]
+        )
+        self.stdout.write(f'Ролей: {len(role_ids)}, бизнес-элементов: {len(element_ids)}')
+
+        rules = self._create_rules(rng, role_ids, element_ids, options['rule_density'], options['batch_size'])
+        self.stdout.write(f'Правил: {rules}')
+
+        users = self._create_users(rng, role_ids, options)
+        self.stdout.write(f'Пользователей: {users}')
+
+        # bulk_create не вызывает сигналы — пересчитываем иерархию ролей
+        # и сбрасываем таблицы прав воркеров один раз
+        role_hierarchy.rebuild()
+        access_matrix.notify_changed()
+
+        self.stdout.write(self.style.SUCCESS(f'Данные сгенерированы за {time.perf_counter() - started:.1f} с'))
+
+    def _create_named(self, model, names):
+        # Повторный запуск с теми же параметрами не создаёт дубликаты
+        model.objects.bulk_create([model(name=name) for name in names], ignore_conflicts=True)
+        ids = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+        return [ids[name] for name in names]
+
+    def _create_rules(self, rng, role_ids, element_ids, density, batch_size):
+        created = 0
+        batch = []
+        for role_id in role_ids:
+            for element_id in element_ids:
+                if rng.random() >= density:
+                    continue
+                flags = {field: rng.random() < 0.5 for field in PERMISSION_FIELDS}
+                batch.append(AccessRule(role_id=role_id, business_element_id=element_id, **flags))
+                if len(batch) >= batch_size:
+                    created += self._flush_rules(batch)
+        return created + self._flush_rules(batch)
+
+    def _create_users(self, rng, role_ids, options):
+        total = options['users']
+        batch_size = options['batch_size']
+        prefix = options['prefix']
+        password = options['password']
+
+        pool = None
+        if options['shared_password']:
+            shared_hash = bcrypt_hash(password)
+        else:
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup)
+
+        created = 0
+        try:
+            for start in range(0, total, batch_size):
+                count = min(batch_size, total - start)
+                if pool is None:
+                    hashes = [shared_hash] * count
+                else:
+                    hashes = list(pool.map(bcrypt_hash, [password] * count, chunksize=max(1, count // 64)))
+                batch = [
+                    User(
+                        first_name=f'User{number}',
+                        last_name=prefix,
+                        email=f'{prefix}_user_{number:08d}@example.com',
+                        password_hash=password_hash,
+                        role_id=rng.choice(role_ids),
+                    )
+                    for number, password_hash in zip(range(start, start + count), hashes)
+                ]
+                created += self._flush(batch, User.objects.filter(email__in=[user.email for user in batch]))
+                self.stdout.write(f'  пользователей: {created}/{total}')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return created
+
+    def _flush_rules(self, batch):
+        existing = AccessRule.objects.filter(
+            role_id__in={rule.role_id for rule in batch},
+            business_element_id__in={rule.business_element_id for rule in batch},
+        )
+        return self._flush(batch, existing)
+
+    def _flush(self, batch, existing):
+        # ignore_conflicts молча пропускает уже существующие строки, поэтому
+        # созданные считаем разницей строк пачки (existing) до и после вставки
+        if not batch:
+            return 0
+        model = type(batch[0])
+        with transaction.atomic():
+            before = existing.count()
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created = existing.count() - before
+        batch.clear()
+        return created
@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.hashing import bcrypt_hash
+from accounts.models import Role, User
+
+NAME_FIELDS = ('first_name', 'last_name', 'patronymic')
+MAX_LENGTHS = {field: User._meta.get_field(field).max_length for field in (*NAME_FIELDS, 'email')}
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт пользователей из JSONL или CSV с параллельным хешированием паролей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .csv (поля как у register: email, password, first_name ...)')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help='По умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Процессов для bcrypt')
+        parser.add_argument('--default-role', default='user', help='Роль, если в строке не указано поле role')
+        parser.add_argument('--report-duplicates', action='store_true', help='Печатать email пропущенных дубликатов')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+
+        # Роли загружаем один раз: имя -> id
+        self.roles = dict(Role.objects.values_list('name', 'id'))
+        if options['default_role'] not in self.roles:
+            raise CommandError(f'Роль "{options["default_role"]}" не найдена в базе данных')
+        self.default_role = options['default_role']
+        self.report_duplicates = options['report_duplicates']
+
+        self.stats = {'read': 0, 'created': 0, 'duplicates': 0, 'invalid': 0}
+        self.hash_seconds = 0.0
+        self.insert_seconds = 0.0
+        self.seen_emails = set()
+        started = time.perf_counter()
+
+        # Каждый процесс пула поднимает Django, чтобы работать и при spawn-запуске
+        with open(path, newline='', encoding='utf-8') as stream, \
+                ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            rows = self._read_rows(stream, file_format)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                self._import_batch(batch, pool, options['workers'])
+                self._progress(started)
+
+        elapsed = time.perf_counter() - started
+        rate = self.stats['created'] / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано {self.stats['read']}, создано {self.stats['created']}, "
+            f"дубликатов {self.stats['duplicates']}, с ошибками {self.stats['invalid']} "
+            f"за {elapsed:.1f} с ({rate:.0f} польз./с; bcrypt {self.hash_seconds:.1f} с, "
+            f"вставка {self.insert_seconds:.1f} с)"
+        ))
+
+    def _read_rows(self, stream, file_format):
+        if file_format == 'csv':
+            yield from csv.DictReader(stream)
+            return
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                self.stderr.write(f'Строка {line_number}: некорректный JSON')
+                self.stats['read'] += 1
+                self.stats['invalid'] += 1
+
+    def _validate(self, row):
+        # Строка JSONL может быть не объектом, а значения — не строками:
+        # такие строки считаются ошибочными, а не прерывают импорт
+        if not isinstance(row, dict):
+            return None
+        email = row.get('email')
+        password = row.get('password')
+        if not isinstance(email, str) or not isinstance(password, str):
+            return None
+        email = email.strip()
+        if not email or not password:
+            return None
+        if row.get('password_confirm') not in (None, '', password):
+            return None
+        if not all(isinstance(row.get(field) or '', str) for field in NAME_FIELDS):
+            return None
+        # Слишком длинное значение сорвало бы bulk_create всей пачки (DataError)
+        if len(email) > MAX_LENGTHS['email'] or any(
+            len(row.get(field) or '') > MAX_LENGTHS[field] for field in NAME_FIELDS
+        ):
+            return None
+        role = row.get('role') or self.default_role
+        if not isinstance(role, str) or role not in self.roles:
+            return None
+        return email, password, role
+
+    def _import_batch(self, batch, pool, workers):
+        self.stats['read'] += len(batch)
+
+        candidates = []
+        for row in batch:
+            valid = self._validate(row)
+            if valid is None:
+                self.stats['invalid'] += 1
+                continue
+            email = valid[0]
+            if email in self.seen_emails:
+                self._duplicate(email)
+                continue
+            self.seen_emails.add(email)
+            candidates.append((row, *valid))
+
+        # Один запрос на пачку для поиска уже существующих email
+        existing = set(
+            User.objects.filter(email__in=[email for _, email, _, _ in candidates])
+            .values_list('email', flat=True)
+        )
+        for email in existing:
+            self._duplicate(email)
+        candidates = [candidate for candidate in candidates if candidate[1] not in existing]
+        if not candidates:
+            return
+
+        start = time.perf_counter()
+        chunksize = max(1, len(candidates) // (workers * 4))
+        hashes = list(pool.map(bcrypt_hash, [password for _, _, password, _ in candidates], chunksize=chunksize))
+        self.hash_seconds += time.perf_counter() - start
+
+        users = [
+            User(
+                **{field: row.get(field) or '' for field in NAME_FIELDS},
+                email=email,
+                password_hash=password_hash,
+                role_id=self.roles[role],
+            )
+            for (row, email, _, role), password_hash in zip(candidates, hashes)
+        ]
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+        self.insert_seconds += time.perf_counter() - start
+        self.stats['created'] += len(users)
+
+    def _duplicate(self, email):
+        self.stats['duplicates'] += 1
+        if self.report_duplicates:
+            self.stderr.write(f'Дубликат: {email}')
+
+    def _progress(self, started):
+        elapsed = time.perf_counter() - started
+        rate = self.stats['created'] / elapsed if elapsed else 0.0
+        self.stdout.write(f"  обработано {self.stats['read']}, создано {self.stats['created']} ({rate:.0f} польз./с)")
@@ -0,0 +1,111 @@
+import bisect
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+# Включается один раз при старте процесса. В выключенном состоянии декораторы
+# возвращают исходные функции, а middleware снимается с конвейера, так что
+# накладные расходы отсутствуют.
+ENABLED = getattr(settings, 'METRICS_ENABLED', False)
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+class Histogram:
+    # Гистограмма в формате Prometheus с одной меткой. Счётчики по корзинам
+    # хранятся некумулятивно и суммируются только при выдаче
+    def __init__(self, name, documentation, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(snapshot.items()):
+            label = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+stage_duration = Histogram(
+    'auth_stage_duration_seconds', 'Время этапов аутентификации и авторизации', 'stage'
+)
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Полное время обработки запроса', 'view'
+)
+request_db_queries = Histogram(
+    'http_request_db_queries', 'Число SQL-запросов на запрос', 'view', buckets=COUNT_BUCKETS
+)
+request_db_duration = Histogram(
+    'http_request_db_duration_seconds', 'Суммарное время SQL-запросов на запрос', 'view'
+)
+
+HISTOGRAMS = [stage_duration, request_duration, request_db_queries, request_db_duration]
+
+
+def instrumented(stage):
+    # Декоратор замера этапа; при выключенных метриках функция не оборачивается
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage_duration.observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# Монотонно растущие значения из stats(): выдаются как counter с суффиксом
+# _total, чтобы rate() и обработка сброса при перезапуске работали верно.
+# Остальные (размер кэша, глубина очереди) — мгновенные gauge
+COUNTER_KEYS = frozenset({'hits', 'misses', 'rejected', 'written', 'dropped', 'failed'})
+
+
+def is_counter(key):
+    return key in COUNTER_KEYS or key.startswith('rejected_')
+
+
+def render(stats=None):
+    # stats — {'префикс': {'имя': число}}, например статистика кэшей
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for prefix, values in (stats or {}).items():
+        for key, value in values.items():
+            if is_counter(key):
+                name = f'auth_{prefix}_{key}_total'
+                lines.append(f'# TYPE {name} counter')
+            else:
+                name = f'auth_{prefix}_{key}'
+                lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,50 @@
+import time
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+
+class QueryCounter:
+    # Обёртка execute_wrapper: считает SQL-запросы и их суммарное время
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    # Время запроса, число и время SQL-запросов по каждому представлению.
+    # При METRICS_ENABLED=False Django исключает middleware из конвейера.
+    # Middleware синхронный: при включённых метриках под ASGI запрос
+    # проходит через переход в поток.
+
+    def __init__(self, get_response):
+        if not metrics.ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unmatched'
+        metrics.request_duration.observe(view, duration)
+        metrics.request_db_queries.observe(view, counter.count)
+        metrics.request_db_duration.observe(view, counter.duration)
+        return response
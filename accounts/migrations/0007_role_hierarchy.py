@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PERMISSION_FIELDS = (
+    'create_permission',
+    'read_permission', 'read_all_permission',
+    'update_permission', 'update_all_permission',
+    'delete_permission', 'delete_all_permission',
+)
+
+
+def fill_hierarchy(apps, schema_editor):
+    # Существующие роли плоские: замыкание — сама роль, права совпадают с AccessRule
+    Role = apps.get_model('accounts', 'Role')
+    RoleClosure = apps.get_model('accounts', 'RoleClosure')
+    AccessRule = apps.get_model('accounts', 'AccessRule')
+    EffectivePermission = apps.get_model('accounts', 'EffectivePermission')
+
+    RoleClosure.objects.bulk_create([
+        RoleClosure(ancestor_id=role_id, descendant_id=role_id, depth=0)
+        for role_id in Role.objects.values_list('id', flat=True)
+    ])
+    EffectivePermission.objects.bulk_create([
+        EffectivePermission(role_id=role_id, business_element_id=element_id, **dict(zip(PERMISSION_FIELDS, flags)))
+        for role_id, element_id, *flags in AccessRule.objects.values_list(
+            'role_id', 'business_element_id', *PERMISSION_FIELDS
+        ).iterator()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='accounts.role'),
+        ),
+        migrations.CreateModel(
+            name='EffectivePermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_permission', models.BooleanField(default=False)),
+                ('read_permission', models.BooleanField(default=False)),
+                ('read_all_permission', models.BooleanField(default=False)),
+                ('update_permission', models.BooleanField(default=False)),
+                ('update_all_permission', models.BooleanField(default=False)),
+                ('delete_permission', models.BooleanField(default=False)),
+                ('delete_all_permission', models.BooleanField(default=False)),
+                ('business_element', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.businesselement')),
+                ('role', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.role')),
+            ],
+            options={
+                'unique_together': {('role', 'business_element')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RoleClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.role')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.role')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(fill_hierarchy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_role_hierarchy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('event', models.CharField(max_length=32)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('email', models.CharField(blank=True, max_length=254)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('method', models.CharField(blank=True, max_length=10)),
+                ('path', models.CharField(blank=True, max_length=255)),
+                ('details', models.JSONField(blank=True, default=dict)),
+            ],
+        ),
+    ]
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.db import models
-import bcrypt
-import jwt
 from datetime import datetime, timedelta
-import os
+import uuid
+
+from . import hashing, metrics
+from .tokens import encode_token
 
 # Create your models here.
 class User(models.Model):
@@ -16,22 +18,93 @@ class User(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     role = models.ForeignKey('Role', on_delete=models.CASCADE, default=2)
+    # Обновляются пачками из accounts.activity, не чаще ACTIVITY_WRITE_INTERVAL
+    last_login = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем поля, от которых зависит слепок в кэше аутентификации
+        instance._loaded_auth_state = instance.auth_state
+        return instance
+
+    @property
+    def auth_state(self):
+        return (self.__dict__.get('is_active'), self.__dict__.get('role_id'))
 
+    # bcrypt выполняется в отдельном пуле (см. accounts.hashing); при его
+    # перегрузке методы выбрасывают HashingUnavailable (503)
+    @metrics.instrumented('password_hash')
     def set_password(self, password):
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        self.password_hash = hashing.hash_password(password)
 
+    @metrics.instrumented('password_check')
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return hashing.check_password(password, self.password_hash)
+
+    async def aset_password(self, password):
+        self.password_hash = await hashing.ahash_password(password)
+
+    async def acheck_password(self, password):
+        return await hashing.acheck_password(password, self.password_hash)
     
-    def generate_jwt(self):
-        payload = {
+    def generate_jwt(self, embed_permissions=None):
+        payload = self.access_token_claims()
+        if self._embeds_permissions(embed_permissions):
+            payload.update(self.permission_claims())
+        return encode_token(payload)
+
+    async def agenerate_jwt(self, embed_permissions=None):
+        payload = self.access_token_claims()
+        if self._embeds_permissions(embed_permissions):
+            payload.update(await self.apermission_claims())
+        return encode_token(payload)
+
+    def access_token_claims(self):
+        # Короткоживущий access-токен. Роль и её имя в нём позволяют
+        # при JWT_STATELESS_ACCESS аутентифицировать запрос без обращения к БД
+        now = datetime.utcnow()
+        return {
             'user_id': self.id,
-            'exp': datetime.utcnow() + timedelta(hours=24),
-            'iat': datetime.utcnow(),
+            'role': self.role_id,
+            'rn': self.role.name,
+            'exp': now + timedelta(seconds=settings.JWT_ACCESS_TTL),
+            'iat': now,
+            # Идентификатор токена для отзыва при выходе
+            'jti': uuid.uuid4().hex,
         }
-        return jwt.encode(payload, os.getenv('SECRET_KEY'), algorithm='HS256')
-    
+
+    def _embeds_permissions(self, embed_permissions):
+        if embed_permissions is None:
+            return settings.JWT_EMBED_PERMISSIONS
+        return embed_permissions
+
+    def permission_claims(self):
+        # Самодостаточный токен: маски прав роли по бизнес-элементам и
+        # поколение правил, с которым они сняты. AccessPermission доверяет
+        # маскам, пока поколение совпадает с текущим: от поколения зависит
+        # и порядок элементов в упакованных масках.
+        # Импорт здесь: access_matrix сам импортирует модели
+        from .access_matrix import access_matrix
+
+        generation = access_matrix.generation
+        return self._permission_claims(generation, access_matrix.packed_masks(self.role_id))
+
+    async def apermission_claims(self):
+        from .access_matrix import access_matrix
+
+        generation = await access_matrix.ageneration()
+        return self._permission_claims(generation, await access_matrix.apacked_masks(self.role_id))
+
+    def _permission_claims(self, generation, packed):
+        # pm — маски, упакованные по байту на бизнес-элемент (см.
+        # AccessMatrix.packed_masks). Слишком длинные маски не встраиваются:
+        # такой токен проверяется по таблице прав, как обычный
+        if len(packed) > settings.JWT_PERMISSIONS_MAX_LENGTH:
+            return {}
+        return {'rv': generation, 'pm': packed}
+
     @property
     def is_authenticated(self):
         return True  
@@ -41,6 +114,15 @@ class User(models.Model):
     
 class Role(models.Model):
     name = models.CharField(max_length=50, unique=True) 
+    # Роль наследует все права родителя (и его предков)
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='children')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # По нему сигнал решает, нужно ли пересчитывать замыкание иерархии
+        instance._loaded_parent_id = instance.__dict__.get('parent_id')
+        return instance
 
 class BusinessElement(models.Model):
     name = models.CharField(max_length=50, unique=True) 
@@ -63,3 +145,106 @@ class AccessRule(models.Model):
 
     class Meta:
         unique_together = ('role', 'business_element')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Правило можно перенести на другую роль или элемент: прежнюю пару
+        # тоже нужно пересчитать в EffectivePermission
+        instance._loaded_pair = instance.rule_pair
+        return instance
+
+    @property
+    def rule_pair(self):
+        return (self.__dict__.get('role_id'), self.__dict__.get('business_element_id'))
+
+
+class RoleClosure(models.Model):
+    # Транзитивное замыкание иерархии ролей: пара (предок, потомок) для
+    # каждого предка, включая саму роль с depth=0 (см. accounts.role_hierarchy)
+    ancestor = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='+')
+    descendant = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='+')
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+
+
+class EffectivePermission(models.Model):
+    # Материализованные права роли с учётом всех предков: поля — OR по
+    # AccessRule предков. Таблица прав в памяти строится по ней, поэтому
+    # проверка не зависит от глубины иерархии
+    role = models.ForeignKey(Role, on_delete=models.CASCADE, related_name='+')
+    business_element = models.ForeignKey(BusinessElement, on_delete=models.CASCADE, related_name='+')
+
+    create_permission = models.BooleanField(default=False)
+    read_permission = models.BooleanField(default=False)
+    read_all_permission = models.BooleanField(default=False)
+    update_permission = models.BooleanField(default=False)
+    update_all_permission = models.BooleanField(default=False)
+    delete_permission = models.BooleanField(default=False)
+    delete_all_permission = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('role', 'business_element')
+
+
+class CacheGeneration(models.Model):
+    # Счётчик поколений для межпроцессной инвалидации локальных кэшей:
+    # каждый воркер сравнивает своё поколение с хранящимся в БД
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls, name):
+        value = cls.objects.filter(name=name).values_list('value', flat=True).first()
+        return value or 0
+
+    @classmethod
+    async def acurrent(cls, name):
+        value = await cls.objects.filter(name=name).values_list('value', flat=True).afirst()
+        return value or 0
+
+    @classmethod
+    def bump(cls, name):
+        # Атомарный инкремент на стороне БД, чтобы параллельные воркеры не теряли обновления
+        updated = cls.objects.filter(name=name).update(value=models.F('value') + 1)
+        if not updated:
+            _, created = cls.objects.get_or_create(name=name, defaults={'value': 1})
+            if not created:
+                cls.objects.filter(name=name).update(value=models.F('value') + 1)
+
+
+class RefreshToken(models.Model):
+    # Хранится только sha256 от непрозрачного refresh-токена. Уникальный индекс
+    # по token_hash даёт поиск одной строки; family связывает цепочку ротаций,
+    # чтобы при повторном использовании отозвать её целиком
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens')
+    token_hash = models.CharField(max_length=64, unique=True)
+    family = models.UUIDField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Истёкшие строки удаляются фоном (accounts.refresh_tokens.purge_expired)
+    expires_at = models.DateTimeField(db_index=True)
+    used_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+
+class RevokedToken(models.Model):
+    # Отозванные access-токены (по jti). После exp токен недействителен
+    # и без отзыва, поэтому строки с истёкшим expires_at удаляются фоном
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class AuditEvent(models.Model):
+    # Журнал входов и решений авторизации. Пишется пачками из фонового
+    # потока (accounts.audit); user_id без внешнего ключа, чтобы записи
+    # переживали удаление пользователя и вставка не проверяла ссылки
+    created_at = models.DateTimeField(db_index=True)
+    event = models.CharField(max_length=32)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    email = models.CharField(max_length=254, blank=True)
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    method = models.CharField(max_length=10, blank=True)
+    path = models.CharField(max_length=255, blank=True)
+    details = models.JSONField(default=dict, blank=True)
@@ -1,47 +1,113 @@
 from rest_framework.permissions import BasePermission
 from rest_framework.exceptions import PermissionDenied
-from .models import BusinessElement, AccessRule
+from . import metrics
+from .audit import PERMISSION_DENIED, audit_log
+from .access_matrix import METHOD_ACTIONS, CompiledRule, access_matrix
 
 class AccessPermission(BasePermission):
     element_name = None 
 
+    @metrics.instrumented('permission_check')
     def has_permission(self, request, view):
         user = request.user
 
-        if not user.is_authenticated:
+        # В settings_production анонимный request.user — None, а не AnonymousUser
+        if not user or not user.is_authenticated:
             # DRF сам вызывает 401, если пользователь не аутентифицирован
             return False
 
-        try:
-            business_element = BusinessElement.objects.get(name=self.element_name)
-        except BusinessElement.DoesNotExist:
-            raise PermissionDenied("Объект не найден в системе контроля доступа.")
-
-        try:
-            rule = AccessRule.objects.get(role=user.role, business_element=business_element)
-        except AccessRule.DoesNotExist:
-            raise PermissionDenied("У вас нет прав на доступ к этому ресурсу.")
-
-        method = request.method
-
-        if method == 'GET':
-            if rule.read_all_permission or rule.read_permission:
-                request.user_role_rule = rule
-                return True
-        elif method == 'POST':
-            if rule.create_permission:
-                request.user_role_rule = rule
-                return True
-        elif method in ['PUT', 'PATCH']:
-            if rule.update_all_permission or rule.update_permission:
-                request.user_role_rule = rule
-                return True
-        elif method == 'DELETE':
-            if rule.delete_all_permission or rule.delete_permission:
-                request.user_role_rule = rule
-                return True
-
-        raise PermissionDenied("У вас нет прав на это действие.")
+        # Самодостаточный токен с актуальным поколением правил авторизует сам
+        claims = self.get_permission_claims(request)
+        if claims is not None and claims['rv'] == access_matrix.generation:
+            rule = self.rule_from_claims(user, claims)
+            if rule is not None:
+                return self.check_rule(request, rule)
+
+        # Иначе правила берём из скомпилированной таблицы в памяти, без запросов к БД
+        if not access_matrix.has_element(self.element_name):
+            self.deny(request, "Объект не найден в системе контроля доступа.")
+
+        rule = access_matrix.get(user.role_id, self.element_name)
+        return self.check_rule(request, rule)
+
+    async def ahas_permission(self, request, view):
+        # Вариант для async-представлений: таблица прав обновляется через async ORM
+        user = request.user
+
+        if not user or not user.is_authenticated:
+            return False
+
+        claims = self.get_permission_claims(request)
+        if claims is not None and claims['rv'] == await access_matrix.ageneration():
+            rule = self.rule_from_claims(user, claims)
+            if rule is not None:
+                return self.check_rule(request, rule)
+
+        if not await access_matrix.ahas_element(self.element_name):
+            self.deny(request, "Объект не найден в системе контроля доступа.")
+
+        rule = await access_matrix.aget(user.role_id, self.element_name)
+        return self.check_rule(request, rule)
+
+    def has_object_permission(self, request, view, obj):
+        # Вызывается после has_permission, правило уже в request.user_role_rule:
+        # без *_all разрешены только свои объекты
+        action = METHOD_ACTIONS.get(request.method)
+        if action is None:
+            return True
+        owner_id = getattr(obj, getattr(view, 'owner_field', 'owner_id'))
+        if action in request.user_role_rule.object_actions(owner_id == request.user.id):
+            return True
+        self.deny(request, "У вас нет прав на это действие с объектом.", object_id=obj.pk)
+
+    def get_permission_claims(self, request):
+        # payload, проверенный JWTAuthentication: повторное декодирование
+        # упало бы, если токен истёк или вытеснен из кэша в ходе запроса
+        payload = getattr(request, 'jwt_payload', None)
+        if payload is None:
+            return None
+        if 'rv' not in payload or not isinstance(payload.get('pm'), str):
+            return None
+        return payload
+
+    def rule_from_claims(self, user, claims):
+        # Роль могла смениться после выдачи токена — тогда маски не годятся
+        if claims.get('role') != user.role_id:
+            return None
+        mask = access_matrix.unpack_mask(claims['pm'], self.element_name)
+        if not mask:
+            # Нет правила в токене: сообщение об ошибке определит таблица прав
+            return None
+        return CompiledRule(user.role_id, self.element_name, mask)
+
+    def check_rule(self, request, rule):
+        if rule is None:
+            self.deny(request, "У вас нет прав на доступ к этому ресурсу.")
+
+        if rule.allows(request.method):
+            request.user_role_rule = rule
+            return True
+
+        self.deny(request, "У вас нет прав на это действие.")
+
+    def deny(self, request, message, **details):
+        # Каждый отказ попадает в журнал аудита (запись в очередь, без запроса к БД)
+        audit_log.record(
+            PERMISSION_DENIED, request, user_id=request.user.id,
+            element=self.element_name, reason=message, **details,
+        )
+        raise PermissionDenied(message)
+
+
+def annotate_allowed_actions(request, rows, owner_field='owner_id'):
+    # Пакетная объектная проверка для страницы списка: правило одно на запрос,
+    # поэтому на объект — одно сравнение владельца, без запросов к БД
+    rule = request.user_role_rule
+    own, other = rule.object_actions(True), rule.object_actions(False)
+    user_id = request.user.id
+    for row in rows:
+        row['allowed_actions'] = own if row[owner_field] == user_id else other
+    return rows
 
 
 class AccessPermissionForProducts(AccessPermission):
@@ -0,0 +1,115 @@
+import hashlib
+import secrets
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from .background import PeriodicTask
+from .models import RefreshToken
+
+
+class InvalidRefreshToken(AuthenticationFailed):
+    default_detail = 'Refresh-токен недействителен или просрочен.'
+    default_code = 'invalid_refresh_token'
+
+
+def purge_expired():
+    # Истёкший токен отклоняется при любом состоянии, поэтому строку можно
+    # удалить. Использованные и отозванные до истечения хранятся: по ним
+    # распознаётся повторное использование
+    RefreshToken.objects.filter(expires_at__lt=timezone.now()).delete()
+
+
+_purger = PeriodicTask(
+    'refresh-tokens-purge',
+    getattr(settings, 'REFRESH_TOKEN_PURGE_INTERVAL', 3600),
+    purge_expired,
+)
+
+
+def hash_token(raw_token):
+    return hashlib.sha256(raw_token.encode('utf-8')).hexdigest()
+
+
+def _new_token(user, family):
+    _purger.ensure_started()
+    raw_token = secrets.token_urlsafe(48)
+    token = RefreshToken(
+        user=user,
+        token_hash=hash_token(raw_token),
+        family=family or uuid.uuid4(),
+        expires_at=timezone.now() + timedelta(seconds=settings.JWT_REFRESH_TTL),
+    )
+    return raw_token, token
+
+
+def issue_refresh_token(user, family=None):
+    raw_token, token = _new_token(user, family)
+    token.save()
+    return raw_token
+
+
+async def aissue_refresh_token(user, family=None):
+    raw_token, token = _new_token(user, family)
+    await token.asave()
+    return raw_token
+
+
+def token_pair(user):
+    return {'token': user.generate_jwt(), 'refresh': issue_refresh_token(user)}
+
+
+async def atoken_pair(user):
+    return {'token': await user.agenerate_jwt(), 'refresh': await aissue_refresh_token(user)}
+
+
+def revoke_family(family):
+    RefreshToken.objects.filter(family=family, revoked_at__isnull=True).update(revoked_at=timezone.now())
+
+
+def revoke_refresh_token(raw_token):
+    family = (
+        RefreshToken.objects.filter(token_hash=hash_token(raw_token))
+        .values_list('family', flat=True)
+        .first()
+    )
+    if family is not None:
+        revoke_family(family)
+
+
+def rotate_refresh_token(raw_token):
+    # Каждый refresh-токен одноразовый: при использовании он помечается
+    # использованным и заменяется новым из того же семейства
+    reused_family = None
+    with transaction.atomic():
+        token = (
+            RefreshToken.objects.select_for_update()
+            .select_related('user__role')
+            .filter(token_hash=hash_token(raw_token))
+            .first()
+        )
+        if token is None:
+            raise InvalidRefreshToken()
+
+        now = timezone.now()
+        if token.used_at is not None and token.revoked_at is None:
+            # Уже использованный токен предъявлен повторно — вероятна кража,
+            # отзываем всю цепочку (после выхода из транзакции, см. ниже)
+            reused_family = token.family
+        elif token.revoked_at is not None or token.expires_at <= now or not token.user.is_active:
+            raise InvalidRefreshToken()
+        else:
+            token.used_at = now
+            token.save(update_fields=['used_at'])
+            raw_new = issue_refresh_token(token.user, family=token.family)
+
+    if reused_family is not None:
+        # Отзыв вне atomic(), чтобы исключение не откатило его
+        revoke_family(reused_family)
+        raise InvalidRefreshToken('Refresh-токен уже был использован.')
+
+    return {'token': token.user.generate_jwt(), 'refresh': raw_new}
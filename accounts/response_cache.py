@@ -0,0 +1,109 @@
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+
+from .access_matrix import access_matrix
+from .cache import TTLCache
+from .models import CacheGeneration
+
+_responses = TTLCache(
+    getattr(settings, 'RESPONSE_CACHE_MAX_SIZE', 10000),
+    getattr(settings, 'RESPONSE_CACHE_TTL', 30),
+)
+
+
+class DataGenerations:
+    # Поколения данных по именам (например, 'data:products'): любое изменение
+    # таблицы увеличивает счётчик в БД, и ключи кэша со старым поколением
+    # перестают совпадать. Свой воркер видит изменение сразу после коммита,
+    # остальные — не позже RESPONSE_CACHE_CHECK_INTERVAL секунд.
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def current(self, name):
+        interval = getattr(settings, 'RESPONSE_CACHE_CHECK_INTERVAL', 2)
+        item = self._values.get(name)
+        if item is not None and time.monotonic() - item[1] < interval:
+            return item[0]
+        value = CacheGeneration.current(name)
+        with self._lock:
+            self._values[name] = (value, time.monotonic())
+        return value
+
+    def bump(self, name):
+        CacheGeneration.bump(name)
+        transaction.on_commit(lambda: self.forget(name))
+
+    def forget(self, name):
+        with self._lock:
+            self._values.pop(name, None)
+
+
+data_generations = DataGenerations()
+
+
+def cache_key(request, endpoint, data_generation):
+    # Ответ зависит только от правила роли (через *_all) и от id пользователя —
+    # для выборки «только свои» или если allowed_actions различаются для своих
+    # и чужих объектов
+    rule = request.user_role_rule
+    scope = 'all' if rule.read_all_permission else 'own'
+    per_user = scope == 'own' or rule.owner_sensitive()
+    return (
+        endpoint,
+        request.META.get('QUERY_STRING', ''),
+        rule.role_id,
+        access_matrix.generation,
+        data_generations.current(data_generation),
+        scope,
+        request.user.id if per_user else None,
+    )
+
+
+def cache_list_response(endpoint, data_generation):
+    # Кэширует готовый (отрендеренный) ответ GET-представления под
+    # @api_view/@permission_classes: повторный запрос с тем же ключом
+    # отдаётся без выполнения представления и сериализации
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Кэшируется только JSON: остальные рендереры (browsable API)
+            # зависят от контекста представления
+            if request.method != 'GET' or request.accepted_renderer.format != 'json':
+                return view(request, *args, **kwargs)
+
+            key = cache_key(request, endpoint, data_generation)
+            cached = _responses.get(key)
+            if cached is not None:
+                content, content_type, link = cached
+                response = HttpResponse(content, content_type=content_type)
+                if link:
+                    response['Link'] = link
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                # Рендерим сами, чтобы сохранить байты ответа
+                response.accepted_renderer = request.accepted_renderer
+                response.accepted_media_type = request.accepted_media_type
+                response.renderer_context = {'view': None, 'request': request, 'response': response}
+                response.render()
+                # Link — ссылка на следующую страницу списка
+                _responses.set(key, (response.content, response['Content-Type'], response.get('Link')))
+            return response
+        return wrapper
+    return decorator
+
+
+def clear():
+    _responses.clear()
+
+
+def stats():
+    return _responses.stats()
@@ -0,0 +1,115 @@
+import bisect
+import hashlib
+import threading
+import time
+from array import array
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .background import PeriodicTask
+from .models import CacheGeneration, RevokedToken
+
+GENERATION_NAME = 'revoked_tokens'
+
+
+def jti_hash(jti):
+    # 64-битный отпечаток jti: весь набор хранится как отсортированный
+    # массив чисел (8 байт на отзыв) и проверяется бинарным поиском
+    return int.from_bytes(hashlib.blake2b(jti.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def purge_expired():
+    RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+
+
+class RevocationSet:
+    # Копия таблицы RevokedToken в памяти воркера. Частый ответ «не отозван»
+    # даётся без запроса; совпадение отпечатка подтверждается запросом в БД,
+    # поэтому коллизия хешей не может отозвать чужой токен. Отзывы из других
+    # воркеров подхватываются по счётчику поколений не позже
+    # REVOCATION_CHECK_INTERVAL секунд.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes = array('q')
+        self._recent = set()
+        self._generation = None
+        self._checked_at = 0.0
+        self._purger = PeriodicTask(
+            'revoked-tokens-purge',
+            getattr(settings, 'REVOCATION_PURGE_INTERVAL', 3600),
+            purge_expired,
+        )
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self._ensure_fresh()
+        if not self._contains(jti_hash(jti)):
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    async def ais_revoked(self, jti):
+        if not jti:
+            return False
+        await self._aensure_fresh()
+        if not self._contains(jti_hash(jti)):
+            return False
+        return await RevokedToken.objects.filter(jti=jti).aexists()
+
+    def revoke(self, jti, expires_at):
+        if isinstance(expires_at, (int, float)):
+            expires_at = datetime.fromtimestamp(expires_at, tz=dt_timezone.utc)
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+        CacheGeneration.bump(GENERATION_NAME)
+        # В своём воркере отзыв действует сразу, не дожидаясь перезагрузки
+        self._recent.add(jti_hash(jti))
+
+    def _contains(self, value):
+        return value in self._recent or self._in_sorted(self._hashes, value)
+
+    def _is_fresh(self):
+        interval = getattr(settings, 'REVOCATION_CHECK_INTERVAL', 5)
+        return self._generation is not None and time.monotonic() - self._checked_at < interval
+
+    def _ensure_fresh(self):
+        self._purger.ensure_started()
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            generation = CacheGeneration.current(GENERATION_NAME)
+            if generation != self._generation:
+                self._replace(self._active_jtis())
+            self._generation = generation
+            self._checked_at = time.monotonic()
+
+    async def _aensure_fresh(self):
+        self._purger.ensure_started()
+        if self._is_fresh():
+            return
+        generation = await CacheGeneration.acurrent(GENERATION_NAME)
+        if generation != self._generation:
+            self._replace([jti async for jti in self._active_jtis()])
+        self._generation = generation
+        self._checked_at = time.monotonic()
+
+    def _active_jtis(self):
+        return RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True)
+
+    def _replace(self, jtis):
+        hashes = array('q', sorted(jti_hash(jti) for jti in jtis))
+        self._hashes = hashes
+        # Локальные отзывы, успевшие попасть в загруженный снимок, больше не нужны
+        self._recent = {value for value in self._recent if not self._in_sorted(hashes, value)}
+
+    @staticmethod
+    def _in_sorted(hashes, value):
+        index = bisect.bisect_left(hashes, value)
+        return index < len(hashes) and hashes[index] == value
+
+
+revocations = RevocationSet()
@@ -0,0 +1,132 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .access_matrix import PERMISSION_FIELDS
+from .models import AccessRule, EffectivePermission, Role, RoleClosure
+
+# Поддержка RoleClosure и EffectivePermission. Изменение правила пересчитывает
+# только его элемент у роли и её потомков; изменение иерархии — замыкание и
+# права поддерева роли. Каждый пересчёт — постоянное число запросов.
+
+_batch = threading.local()
+
+
+class HierarchyCycle(ValueError):
+    pass
+
+
+def _ancestors(role_id, parents):
+    # Цепочка от роли к корню: [(предок, глубина)], включая саму роль
+    chain = []
+    seen = set()
+    current = role_id
+    while current is not None:
+        if current in seen:
+            raise HierarchyCycle(f'Цикл в иерархии ролей: роль {role_id}')
+        seen.add(current)
+        chain.append((current, len(chain)))
+        current = parents.get(current)
+    return chain
+
+
+def check_parent(role):
+    # Родитель не может быть потомком самой роли
+    if role.parent_id is None or role.pk is None:
+        return
+    if role.parent_id == role.pk or RoleClosure.objects.filter(ancestor_id=role.pk, descendant_id=role.parent_id).exists():
+        raise HierarchyCycle(f'Цикл в иерархии ролей: роль {role.pk}')
+
+
+def descendants(role_ids):
+    # Роли вместе со всеми потомками
+    role_ids = set(role_ids)
+    return role_ids | set(
+        RoleClosure.objects.filter(ancestor_id__in=role_ids).values_list('descendant_id', flat=True)
+    )
+
+
+def rebuild_closure(role_ids):
+    parents = dict(Role.objects.values_list('id', 'parent_id'))
+    rows = [
+        RoleClosure(ancestor_id=ancestor, descendant_id=role_id, depth=depth)
+        for role_id in role_ids if role_id in parents
+        for ancestor, depth in _ancestors(role_id, parents)
+    ]
+    with transaction.atomic():
+        RoleClosure.objects.filter(descendant_id__in=role_ids).delete()
+        RoleClosure.objects.bulk_create(rows)
+
+
+def recompute(role_ids, element_ids=None):
+    # Права ролей role_ids по элементам element_ids (None — по всем элементам)
+    role_ids = set(role_ids)
+    closure = RoleClosure.objects.filter(descendant_id__in=role_ids).values_list('descendant_id', 'ancestor_id')
+    heirs = defaultdict(list)
+    for descendant, ancestor in closure:
+        heirs[ancestor].append(descendant)
+
+    rules = AccessRule.objects.filter(role_id__in=heirs).values_list('role_id', 'business_element_id', *PERMISSION_FIELDS)
+    if element_ids is not None:
+        rules = rules.filter(business_element_id__in=element_ids)
+
+    effective = {}
+    for role_id, element_id, *flags in rules:
+        for heir in heirs[role_id]:
+            current = effective.get((heir, element_id))
+            effective[(heir, element_id)] = flags if current is None else [a or b for a, b in zip(current, flags)]
+
+    stale = EffectivePermission.objects.filter(role_id__in=role_ids)
+    if element_ids is not None:
+        stale = stale.filter(business_element_id__in=element_ids)
+    with transaction.atomic():
+        stale.delete()
+        EffectivePermission.objects.bulk_create([
+            EffectivePermission(role_id=role_id, business_element_id=element_id, **dict(zip(PERMISSION_FIELDS, flags)))
+            for (role_id, element_id), flags in effective.items()
+        ])
+
+
+def rules_changed(pairs):
+    # pairs — [(role_id, business_element_id)] изменённых правил
+    pairs = set(pairs)
+    if not pairs:
+        return
+    if getattr(_batch, 'depth', 0):
+        _batch.pairs |= pairs
+        return
+    recompute(descendants(role for role, _ in pairs), {element for _, element in pairs})
+
+
+def hierarchy_changed(role_id):
+    # Новая роль или смена родителя: поддерево роли получает новых предков
+    subtree = descendants([role_id])
+    rebuild_closure(subtree)
+    recompute(subtree)
+
+
+def rebuild():
+    # Полный пересчёт: после удаления ролей и массовой загрузки в обход сигналов
+    role_ids = set(Role.objects.values_list('id', flat=True))
+    with transaction.atomic():
+        RoleClosure.objects.all().delete()
+        rebuild_closure(role_ids)
+        EffectivePermission.objects.all().delete()
+        recompute(role_ids)
+
+
+@contextmanager
+def batch():
+    # Пакетное изменение правил: один пересчёт на все затронутые пары
+    _batch.depth = getattr(_batch, 'depth', 0) + 1
+    if _batch.depth == 1:
+        _batch.pairs = set()
+    try:
+        yield
+    finally:
+        _batch.depth -= 1
+    # При исключении пересчёт не нужен: транзакция откатится
+    if _batch.depth == 0:
+        rules_changed(_batch.pairs)
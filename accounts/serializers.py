@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from .access_matrix import PERMISSION_FIELDS
 from .models import User, Role, BusinessElement, AccessRule
 
 class RoleSerializer(serializers.ModelSerializer):
@@ -50,6 +51,114 @@ class UserSerializer(serializers.ModelSerializer):
 #         fields = '__all__'
 
 class AccessRuleSerializer(serializers.ModelSerializer):
+    # Имена роли и элемента, чтобы клиентам не нужны были дополнительные запросы.
+    # В списках используйте select_related('role', 'business_element')
+    role_name = serializers.CharField(source='role.name', read_only=True)
+    business_element_name = serializers.CharField(source='business_element.name', read_only=True)
+
     class Meta:
         model = AccessRule
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+def _is_id(value):
+    # Идентификатор из JSON: только целое число (true/false и списки не подходят)
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class AccessRuleBulkSerializer(serializers.Serializer):
+    # Пакет изменений правил: create — новые правила, update — {'id': ..., флаги},
+    # delete — список id. Весь пакет проверяется несколькими запросами на множества,
+    # а не отдельной валидацией каждого правила
+    create = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    update = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    MAX_ITEMS = 5000
+
+    def validate(self, attrs):
+        if sum(len(attrs[key]) for key in ('create', 'update', 'delete')) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f'Не более {self.MAX_ITEMS} операций за запрос.')
+
+        errors = {}
+        delete_ids = set(attrs['delete'])
+        existing = AccessRule.objects.in_bulk(
+            [item.get('id') for item in attrs['update'] if _is_id(item.get('id'))] + list(delete_ids)
+        )
+
+        missing = sorted(rule_id for rule_id in delete_ids if rule_id not in existing)
+        if missing:
+            errors['delete'] = [f'Правила не найдены: {missing}']
+
+        updates, update_errors = [], {}
+        for index, item in enumerate(attrs['update']):
+            rule = existing.get(item.get('id')) if _is_id(item.get('id')) else None
+            if rule is None:
+                update_errors[index] = ['Правило не найдено.']
+                continue
+            if rule.id in delete_ids:
+                update_errors[index] = ['Правило одновременно обновляется и удаляется.']
+                continue
+            try:
+                flags = self._flags(item, partial=True, exclude=('id',))
+            except serializers.ValidationError as exc:
+                update_errors[index] = exc.detail
+                continue
+            for field, value in flags.items():
+                setattr(rule, field, value)
+            updates.append(rule)
+        if update_errors:
+            errors['update'] = update_errors
+
+        creates, create_errors = self._validate_creates(attrs['create'], delete_ids)
+        if create_errors:
+            errors['create'] = create_errors
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return {'create': creates, 'update': updates, 'delete': delete_ids}
+
+    def _validate_creates(self, items, delete_ids):
+        errors = {}
+        roles = Role.objects.in_bulk({item.get('role') for item in items if _is_id(item.get('role'))})
+        elements = BusinessElement.objects.in_bulk(
+            {item.get('business_element') for item in items if _is_id(item.get('business_element'))}
+        )
+        # Пары, уже занятые существующими правилами (кроме удаляемых в этом же пакете)
+        taken = set(
+            AccessRule.objects.filter(role_id__in=roles, business_element_id__in=elements)
+            .exclude(id__in=delete_ids)
+            .values_list('role_id', 'business_element_id')
+        )
+
+        creates = []
+        for index, item in enumerate(items):
+            role = roles.get(item.get('role')) if _is_id(item.get('role')) else None
+            element = elements.get(item.get('business_element')) if _is_id(item.get('business_element')) else None
+            if role is None or element is None:
+                errors[index] = ['Роль или бизнес-элемент не найдены.']
+                continue
+            pair = (role.id, element.id)
+            if pair in taken:
+                errors[index] = ['Правило для этой роли и элемента уже существует.']
+                continue
+            try:
+                flags = self._flags(item, partial=False, exclude=('role', 'business_element'))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+                continue
+            taken.add(pair)
+            creates.append(AccessRule(role=role, business_element=element, **flags))
+        return creates, errors
+
+    def _flags(self, item, partial, exclude):
+        unknown = set(item) - set(PERMISSION_FIELDS) - set(exclude)
+        if unknown:
+            raise serializers.ValidationError([f'Неизвестные поля: {sorted(unknown)}'])
+        boolean = serializers.BooleanField()
+        flags = {}
+        for field in PERMISSION_FIELDS:
+            if field in item:
+                flags[field] = boolean.to_internal_value(item[field])
+            elif not partial:
+                flags[field] = False
+        return flags
@@ -0,0 +1,75 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import role_hierarchy, user_cache
+from .access_matrix import access_matrix
+from .models import AccessRule, BusinessElement, Role, User
+
+
+# Материализованные права пересчитываются до сброса таблицы прав,
+# поэтому эти обработчики подключены первыми
+@receiver(post_save, sender=AccessRule)
+@receiver(post_delete, sender=AccessRule)
+def access_rule_changed(sender, instance, **kwargs):
+    pairs = [instance.rule_pair]
+    loaded = getattr(instance, '_loaded_pair', None)
+    if loaded is not None:
+        pairs.append(loaded)
+    role_hierarchy.rules_changed(pairs)
+    instance._loaded_pair = instance.rule_pair
+
+
+@receiver(pre_save, sender=Role)
+def role_saving(sender, instance, **kwargs):
+    if instance.parent_id != getattr(instance, '_loaded_parent_id', None):
+        role_hierarchy.check_parent(instance)
+
+
+@receiver(post_save, sender=Role)
+def role_saved(sender, instance, created, **kwargs):
+    # Замыкание пересчитывается только для новой роли или при смене родителя
+    if created or instance.parent_id != getattr(instance, '_loaded_parent_id', None):
+        role_hierarchy.hierarchy_changed(instance.id)
+    instance._loaded_parent_id = instance.parent_id
+
+
+@receiver(pre_delete, sender=Role)
+def role_deleting(sender, instance, **kwargs):
+    # После удаления дочерние роли уже не найти: SET_NULL обнуляет parent
+    instance._child_ids = list(Role.objects.filter(parent_id=instance.pk).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Role)
+def role_deleted(sender, instance, **kwargs):
+    # Строки замыкания и прав самой роли удалены каскадом; пересчитываются
+    # только поддеревья её детей, оставшихся без родителя
+    for child_id in getattr(instance, '_child_ids', ()):
+        role_hierarchy.hierarchy_changed(child_id)
+
+
+# Любое изменение правил, ролей или бизнес-элементов (в т.ч. через
+# access_rules_view и access_rule_detail_view) сбрасывает таблицу прав
+@receiver(post_save, sender=AccessRule)
+@receiver(post_delete, sender=AccessRule)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=BusinessElement)
+@receiver(post_delete, sender=BusinessElement)
+def access_rules_changed(sender, **kwargs):
+    access_matrix.notify_changed()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+    # Сбрасываем кэш только если изменились активность или роль
+    loaded = getattr(instance, '_loaded_auth_state', None)
+    if loaded != instance.auth_state:
+        user_cache.invalidate(instance.id)
+        instance._loaded_auth_state = instance.auth_state
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_cache.invalidate(instance.id)
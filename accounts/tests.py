@@ -1,3 +1,943 @@
-from django.test import TestCase
+import atexit
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import jwt
+
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import db_router, hashing, metrics, response_cache, role_hierarchy, tokens, user_cache
+from .access_matrix import PERM_READ, access_matrix
+from .activity import ActivityTracker
+from .audit import LOGIN_FAILED, LOGIN_SUCCEEDED, AuditLog
+from .authentication import JWTAuthentication
+from .background import PeriodicTask
+from .models import AccessRule, AuditEvent, BusinessElement, EffectivePermission, RefreshToken, Role, RoleClosure, User
+from .refresh_tokens import hash_token, issue_refresh_token, purge_expired as purge_expired_refresh_tokens, token_pair
+from .role_hierarchy import HierarchyCycle
+from .throttling import login_limits
+from .tokens import decode_token
+
+
+# Кэши процесса переживают откат транзакции между тестами, поэтому
+# сверяем поколения на каждом обращении и сбрасываем кэши в setUp
+@override_settings(
+    ACCESS_MATRIX_CHECK_INTERVAL=0,
+    RESPONSE_CACHE_CHECK_INTERVAL=0,
+    REVOCATION_CHECK_INTERVAL=0,
+    JWT_EMBED_PERMISSIONS=False,
+    JWT_STATELESS_ACCESS=False,
+)
+class ApiTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Фоновые потоки (аудит, активность, очистка отзывов) пишут в БД
+        # вне транзакции теста; в тестах очереди сбрасываются явно
+        patcher = mock.patch.object(PeriodicTask, 'ensure_started')
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('init_data', stdout=StringIO())
+        cls.admin = User.objects.get(email='admin@example.com')
+        cls.user = User.objects.get(email='user@example.com')
+        cls.manager = User.objects.get(email='manager@example.com')
+
+    def setUp(self):
+        access_matrix.invalidate()
+        user_cache.clear()
+        response_cache.clear()
+
+    def auth(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {user.generate_jwt()}'}
+
+    def rule(self, role_name, element_name):
+        return AccessRule.objects.get(role__name=role_name, business_element__name=element_name)
+
+
+class AccessRuleMoveTests(ApiTestCase):
+
+    def test_moved_rule_revokes_old_pair(self):
+        rule = self.rule('user', 'products')
+        manager = Role.objects.get(name='manager')
+        products = BusinessElement.objects.get(name='products')
+        self.rule('manager', 'products').delete()
+        self.assertEqual(self.client.get('/api/products/', **self.auth(self.user)).status_code, 200)
+
+        response = self.client.patch(
+            f'/api/auth/access-rules/{rule.id}/', {'role': manager.id},
+            content_type='application/json', **self.auth(self.admin),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            EffectivePermission.objects.filter(role__name='user', business_element=products).exists()
+        )
+        self.assertTrue(EffectivePermission.objects.filter(role=manager, business_element=products).exists())
+        self.assertEqual(self.client.get('/api/products/', **self.auth(self.user)).status_code, 403)
+        self.assertEqual(self.client.get('/api/products/', **self.auth(self.manager)).status_code, 200)
+
+
+@override_settings(LOGIN_THROTTLE_IP_RATE='3/min', LOGIN_THROTTLE_EMAIL_RATE='100/min', LOGIN_THROTTLE_CACHE='')
+class LoginThrottleTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        login_limits.clear()
+        self.addCleanup(login_limits.clear)
+
+    def test_forwarded_for_does_not_bypass_ip_limit(self):
+        codes = [
+            self.client.post(
+                '/api/auth/login/', {'email': f'nobody{i}@example.com', 'password': 'bad'},
+                content_type='application/json', HTTP_X_FORWARDED_FOR=f'10.0.{i}.1',
+            ).status_code
+            for i in range(5)
+        ]
+        self.assertEqual(codes, [401, 401, 401, 429, 429])
+
+
+@override_settings(JWT_EMBED_PERMISSIONS=True)
+class EmbeddedPermissionTests(ApiTestCase):
+
+    def test_masks_are_packed_per_element(self):
+        role = Role.objects.get(name='user')
+        elements = BusinessElement.objects.bulk_create(
+            BusinessElement(name=f'element_{i}') for i in range(300)
+        )
+        AccessRule.objects.bulk_create(
+            AccessRule(role=role, business_element=element, read_permission=True) for element in elements
+        )
+        role_hierarchy.rebuild()
+        access_matrix.notify_changed()
+
+        token = self.user.generate_jwt()
+        claims = decode_token(token)
+
+        self.assertLess(len(token), 1000)
+        self.assertEqual(claims['rv'], access_matrix.generation)
+        self.assertEqual(access_matrix.unpack_mask(claims['pm'], 'element_299'), PERM_READ)
+        self.assertEqual(access_matrix.unpack_mask(claims['pm'], 'access_rules'), 0)
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        self.assertEqual(self.client.get('/api/products/', **headers).status_code, 200)
+        self.assertEqual(self.client.put('/api/orders/', {'id': 1, 'status': 'x'}, content_type='application/json', **headers).status_code, 403)
+
+    def test_claims_come_from_authenticated_payload(self):
+        token = self.user.generate_jwt()
+        payload = decode_token(token)
+
+        # Запись вытеснена из кэша проверенных токенов, а токен истёк
+        # между аутентификацией и проверкой прав
+        with mock.patch.object(tokens._verified, 'get', return_value=None), \
+                mock.patch('accounts.tokens.jwt.decode', side_effect=[payload, jwt.ExpiredSignatureError]):
+            response = self.client.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(JWT_PERMISSIONS_MAX_LENGTH=2)
+    def test_oversized_masks_are_not_embedded(self):
+        claims = decode_token(self.user.generate_jwt())
+
+        self.assertNotIn('pm', claims)
+        self.assertEqual(self.client.get('/api/products/', **self.auth(self.user)).status_code, 200)
+
+
+class RefreshTokenPurgeTests(ApiTestCase):
+
+    def test_purge_deletes_only_expired_tokens(self):
+        live = issue_refresh_token(self.user)
+        expired = issue_refresh_token(self.user)
+        RefreshToken.objects.filter(token_hash=hash_token(expired)).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        purge_expired_refresh_tokens()
+
+        self.assertEqual(
+            list(RefreshToken.objects.values_list('token_hash', flat=True)), [hash_token(live)]
+        )
+
+
+class AuthzCheckTests(ApiTestCase):
+
+    def test_non_object_body_is_bad_request(self):
+        for body in ([], [{'checks': []}], '"checks"'):
+            response = self.client.post(
+                '/api/authz/check/', body, content_type='application/json', **self.auth(self.admin)
+            )
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('error', response.json())
+
+    def test_malformed_items_get_error_codes(self):
+        checks = [
+            {'user_id': self.user.id, 'element': 'products', 'action': 'read'},
+            {'user_id': self.user.id, 'element': ['products'], 'action': 'read'},
+            {'user_id': self.user.id, 'element': 'products', 'action': {}},
+            {'user_id': self.user.id, 'element': 'products', 'action': ['read']},
+        ]
+
+        response = self.client.post(
+            '/api/authz/check/', {'checks': checks}, content_type='application/json', **self.auth(self.admin)
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'allowed': True, 'scope': 'own'},
+            {'allowed': False, 'error': 'unknown_element'},
+            {'allowed': False, 'error': 'unknown_action'},
+            {'allowed': False, 'error': 'unknown_action'},
+        ])
+
+
+class AccessRuleBulkTests(ApiTestCase):
+
+    def post_bulk(self, data):
+        return self.client.post(
+            '/api/auth/access-rules/bulk/', data, content_type='application/json', **self.auth(self.admin)
+        )
+
+    def test_non_integer_ids_are_validation_errors(self):
+        element = BusinessElement.objects.create(name='reports')
+        rule = self.rule('user', 'products')
+
+        response = self.post_bulk({
+            'create': [
+                {'role': [self.user.role_id], 'business_element': element.id},
+                {'role': True, 'business_element': element.id},
+            ],
+            'update': [{'id': [rule.id], 'read_permission': False}, {'id': True, 'read_permission': False}],
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['create']), {'0', '1'})
+        self.assertEqual(set(response.json()['update']), {'0', '1'})
+        self.assertTrue(self.rule('user', 'products').read_permission)
+
+    def test_bulk_changes_rebuild_matrix(self):
+        element = BusinessElement.objects.create(name='reports')
+        self.assertIsNone(access_matrix.get(self.user.role_id, 'reports'))
+
+        response = self.post_bulk({
+            'create': [{'role': self.user.role_id, 'business_element': element.id, 'read_permission': True}],
+            'update': [{'id': self.rule('user', 'products').id, 'read_permission': False}],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(access_matrix.get(self.user.role_id, 'reports').read_permission)
+        self.assertFalse(access_matrix.get(self.user.role_id, 'products').read_permission)
+
+    def test_replace_rule_in_one_batch(self):
+        rule = self.rule('user', 'products')
+
+        response = self.post_bulk({
+            'delete': [rule.id],
+            'create': [{'role': rule.role_id, 'business_element': rule.business_element_id, 'update_permission': True}],
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['deleted'], 1)
+        replaced = self.rule('user', 'products')
+        self.assertNotEqual(replaced.id, rule.id)
+        self.assertFalse(replaced.read_permission)
+        self.assertTrue(access_matrix.get(self.user.role_id, 'products').update_permission)
+        self.assertFalse(access_matrix.get(self.user.role_id, 'products').read_permission)
+
+
+class ImportUsersTests(ApiTestCase):
+
+    def test_malformed_rows_are_counted_as_invalid(self):
+        lines = [
+            '{"email": "first@example.com", "password": "secret123"}',
+            '[1, 2, 3]',
+            '{"email": "second@example.com", "password": 12345}',
+            '{"email": ["x"], "password": "secret123"}',
+            '{"email": "third@example.com", "password": "secret123", "role": ["user"]}',
+            '{"email": "%s@example.com", "password": "secret123"}' % ('x' * 250),
+            '{"email": "long@example.com", "password": "secret123", "first_name": "%s"}' % ('x' * 101),
+            '{"email": "last@example.com", "password": "secret123"}',
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as stream:
+            stream.write('\n'.join(lines))
+        self.addCleanup(os.remove, stream.name)
+        output = StringIO()
+
+        call_command('import_users', stream.name, batch_size=2, workers=1, stdout=output, stderr=StringIO())
+
+        self.assertIn('создано 2', output.getvalue())
+        self.assertIn('с ошибками 6', output.getvalue())
+        self.assertTrue(User.objects.filter(email='last@example.com').exists())
+
+
+class IntrospectionTests(ApiTestCase):
+
+    def introspect(self, token, **headers):
+        return self.client.post('/api/auth/introspect/', {'token': token}, content_type='application/json', **headers)
+
+    def test_requires_service_caller(self):
+        token = self.user.generate_jwt()
+
+        self.assertEqual(self.introspect(token).status_code, 401)
+        self.assertEqual(self.introspect(token, **self.auth(self.user)).status_code, 403)
+
+        response = self.introspect(token, **self.auth(self.admin))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user_id'], self.user.id)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_revoked_token_is_inactive(self):
+        token = self.user.generate_jwt()
+        self.client.post('/api/auth/logout/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        response = self.introspect(token, **self.auth(self.admin))
+
+        self.assertEqual(response.json(), {'active': False})
+
+
+class AccessMatrixTests(ApiTestCase):
+
+    def get_products(self, user):
+        return self.client.get('/api/products/', **self.auth(user)).status_code
+
+    def test_rule_update_through_view(self):
+        rule = self.rule('user', 'products')
+        self.assertEqual(self.get_products(self.user), 200)
+
+        response = self.client.patch(
+            f'/api/auth/access-rules/{rule.id}/', {'read_permission': False},
+            content_type='application/json', **self.auth(self.admin),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_products(self.user), 403)
+
+    def test_rule_delete_through_view(self):
+        rule = self.rule('user', 'products')
+        self.assertEqual(self.get_products(self.user), 200)
+
+        response = self.client.delete(f'/api/auth/access-rules/{rule.id}/', **self.auth(self.admin))
+
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(access_matrix.get(self.user.role_id, 'products'))
+        self.assertEqual(self.get_products(self.user), 403)
+
+    def test_rule_create_through_view(self):
+        element = BusinessElement.objects.create(name='reports')
+        self.assertTrue(access_matrix.has_element('reports'))
+        self.assertIsNone(access_matrix.get(self.user.role_id, 'reports'))
+
+        response = self.client.post(
+            '/api/auth/access-rules/',
+            {'role': self.user.role_id, 'business_element': element.id, 'read_permission': True},
+            content_type='application/json', **self.auth(self.admin),
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(access_matrix.get(self.user.role_id, 'reports').read_permission)
+
+    def test_element_delete(self):
+        self.assertEqual(self.get_products(self.user), 200)
+
+        BusinessElement.objects.get(name='products').delete()
+
+        self.assertFalse(access_matrix.has_element('products'))
+        self.assertIsNone(access_matrix.get(self.user.role_id, 'products'))
+        self.assertEqual(self.get_products(self.user), 403)
+
+    def test_role_change(self):
+        auditor = Role.objects.create(name='auditor')
+        AccessRule.objects.create(
+            role=auditor, business_element=BusinessElement.objects.get(name='products'), read_all_permission=True,
+        )
+        role_id = auditor.id
+        self.assertTrue(access_matrix.get(role_id, 'products').read_all_permission)
+
+        auditor.delete()
+
+        self.assertIsNone(access_matrix.get(role_id, 'products'))
+
+
+class UserCacheTests(ApiTestCase):
+
+    def get_profile(self):
+        return self.client.get('/api/auth/profile/', **self.auth(self.user))
+
+    def test_deactivation_invalidates_cache(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.get_profile().status_code, 401)
+
+    def test_role_change_invalidates_cache(self):
+        headers = self.auth(self.user)
+        order = {'id': 1, 'status': 'shipped'}
+        put_order = lambda: self.client.put('/api/orders/', order, content_type='application/json', **headers)
+        self.assertEqual(put_order().status_code, 403)
+
+        self.user.role = Role.objects.get(name='manager')
+        self.user.save()
+
+        # Заказа нет, но право на изменение у роли manager уже есть
+        self.assertEqual(put_order().status_code, 404)
+
+    def test_unrelated_change_keeps_snapshot(self):
+        snapshot = user_cache.get_active_user(self.user.id)
+
+        user = User.objects.get(id=self.user.id)
+        user.first_name = 'Другое'
+        user.save()
+
+        self.assertIs(user_cache.get_active_user(self.user.id), snapshot)
+
+
+class RefreshRotationTests(ApiTestCase):
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': token}, content_type='application/json')
+
+    def test_refresh_rotates_token(self):
+        first = token_pair(self.user)['refresh']
+
+        response = self.refresh(first)
+
+        self.assertEqual(response.status_code, 200)
+        second = response.json()['refresh']
+        self.assertNotEqual(second, first)
+        self.assertEqual(
+            self.client.get('/api/auth/profile/', HTTP_AUTHORIZATION=f"Bearer {response.json()['token']}").status_code,
+            200,
+        )
+        self.assertEqual(self.refresh(second).status_code, 200)
+
+    def test_reuse_revokes_family(self):
+        first = token_pair(self.user)['refresh']
+        second = self.refresh(first).json()['refresh']
+
+        self.assertEqual(self.refresh(first).status_code, 401)
+
+        # Украденный токен использован повторно — вся цепочка отозвана
+        self.assertEqual(self.refresh(second).status_code, 401)
+        family = RefreshToken.objects.get(token_hash=hash_token(first)).family
+        self.assertFalse(RefreshToken.objects.filter(family=family, revoked_at__isnull=True).exists())
+
+    def test_non_string_refresh_is_bad_request(self):
+        for value in (123, ['a'], {'a': 1}):
+            self.assertEqual(self.refresh(value).status_code, 400, value)
+
+    def test_inactive_user_cannot_refresh(self):
+        refresh = token_pair(self.user)['refresh']
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+
+
+class LogoutTests(ApiTestCase):
+
+    def test_logout_revokes_access_and_refresh(self):
+        pair = token_pair(self.user)
+        other = self.user.generate_jwt()
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {pair['token']}"}
+        self.assertEqual(self.client.get('/api/auth/profile/', **headers).status_code, 200)
+
+        response = self.client.post(
+            '/api/auth/logout/', {'refresh': pair['refresh']}, content_type='application/json', **headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/profile/', **headers).status_code, 401)
+        self.assertEqual(
+            self.client.get('/api/auth/profile/', HTTP_AUTHORIZATION=f'Bearer {other}').status_code, 200
+        )
+        self.assertEqual(
+            self.client.post(
+                '/api/auth/refresh/', {'refresh': pair['refresh']}, content_type='application/json'
+            ).status_code,
+            401,
+        )
+
+    def test_non_string_refresh_is_bad_request(self):
+        token = self.user.generate_jwt()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+        for value in (123, ['a']):
+            response = self.client.post('/api/auth/logout/', {'refresh': value}, content_type='application/json', **headers)
+            self.assertEqual(response.status_code, 400, value)
+        # Некорректный запрос не отзывает токен
+        self.assertEqual(self.client.get('/api/auth/profile/', **headers).status_code, 200)
+
+    def test_uses_payload_verified_by_authentication(self):
+        headers = self.auth(self.user)
+
+        # Повторное декодирование в представлении упало бы, если бы токен
+        # истёк после аутентификации
+        with mock.patch.object(tokens, 'decode_token', side_effect=jwt.ExpiredSignatureError):
+            response = self.client.post('/api/auth/logout/', **headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/profile/', **headers).status_code, 401)
+
+
+class AccessRulesListTests(ApiTestCase):
+
+    def test_out_of_range_ids_are_bad_request(self):
+        for query in ('role=99999999999999999999999', 'business_element=9223372036854775808',
+                      'after=99999999999999999999999', 'after=-99999999999999999999999'):
+            response = self.client.get(f'/api/auth/access-rules/?{query}', **self.auth(self.admin))
+            self.assertEqual(response.status_code, 400, query)
+
+        response = self.client.get('/api/auth/access-rules/?role=9223372036854775807', **self.auth(self.admin))
+        self.assertEqual(response.json(), [])
+
+    def test_rules_list_etag_changes_with_rules(self):
+        first = self.client.get('/api/auth/access-rules/', **self.auth(self.admin))
+        cached = self.client.get(
+            '/api/auth/access-rules/', HTTP_IF_NONE_MATCH=first['ETag'], **self.auth(self.admin)
+        )
+        self.assertEqual(cached.status_code, 304)
+
+        rule = self.rule('user', 'orders')
+        rule.create_permission = False
+        rule.save()
+
+        changed = self.client.get(
+            '/api/auth/access-rules/', HTTP_IF_NONE_MATCH=first['ETag'], **self.auth(self.admin)
+        )
+        self.assertEqual(changed.status_code, 200)
+
+
+class RoleHierarchyTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.base = Role.objects.get(name='user')
+        self.senior = Role.objects.create(name='senior', parent=self.base)
+        self.lead = Role.objects.create(name='lead', parent=self.senior)
+
+    def effective(self, role, element_name):
+        return EffectivePermission.objects.filter(role=role, business_element__name=element_name).first()
+
+    def test_closure_covers_all_ancestors(self):
+        closure = set(RoleClosure.objects.filter(descendant=self.lead).values_list('ancestor_id', 'depth'))
+
+        self.assertEqual(closure, {(self.lead.id, 0), (self.senior.id, 1), (self.base.id, 2)})
+        self.assertTrue(self.effective(self.lead, 'products').read_permission)
+        self.assertTrue(access_matrix.get(self.lead.id, 'products').read_permission)
+
+    def test_parent_rule_edit_reaches_descendants(self):
+        response = self.client.patch(
+            f"/api/auth/access-rules/{self.rule('user', 'products').id}/", {'update_permission': True},
+            content_type='application/json', **self.auth(self.admin),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.effective(self.lead, 'products').update_permission)
+        self.assertTrue(access_matrix.get(self.lead.id, 'products').update_permission)
+
+    def test_own_rule_is_merged_with_inherited(self):
+        AccessRule.objects.create(
+            role=self.senior, business_element=BusinessElement.objects.get(name='products'), delete_permission=True,
+        )
+
+        effective = self.effective(self.lead, 'products')
+        self.assertTrue(effective.read_permission)
+        self.assertTrue(effective.delete_permission)
+        self.assertFalse(self.effective(self.base, 'products').delete_permission)
+
+    def test_reparent_rebuilds_subtree(self):
+        self.senior.parent = Role.objects.get(name='manager')
+        self.senior.save()
+
+        ancestors = set(RoleClosure.objects.filter(descendant=self.lead).values_list('ancestor__name', flat=True))
+        self.assertEqual(ancestors, {'lead', 'senior', 'manager'})
+        # У user нет прав на изменение заказов, у manager — есть
+        self.assertTrue(self.effective(self.lead, 'orders').update_all_permission)
+
+    def test_cycle_is_rejected(self):
+        self.base.parent = self.lead
+
+        with self.assertRaises(HierarchyCycle):
+            self.base.save()
+        self.assertIsNone(Role.objects.get(id=self.base.id).parent_id)
+
+    def test_deleted_parent_detaches_children(self):
+        self.senior.delete()
+
+        self.assertEqual(
+            set(RoleClosure.objects.filter(descendant=self.lead).values_list('ancestor_id', flat=True)), {self.lead.id}
+        )
+        self.assertIsNone(self.effective(self.lead, 'products'))
+
+    def test_delete_touches_only_affected_subtree(self):
+        manager = Role.objects.get(name='manager')
+        untouched = set(RoleClosure.objects.filter(descendant=manager).values_list('id', flat=True))
+
+        with mock.patch.object(role_hierarchy, 'rebuild') as rebuild:
+            self.senior.delete()
+
+        rebuild.assert_not_called()
+        self.assertEqual(set(RoleClosure.objects.filter(descendant=manager).values_list('id', flat=True)), untouched)
+        self.assertTrue(self.effective(self.base, 'products').read_permission)
+        self.assertTrue(access_matrix.get(self.base.id, 'products').read_permission)
+        self.assertIsNone(access_matrix.get(self.lead.id, 'products'))
+
+
+class MetricsTests(ApiTestCase):
+
+    def test_disabled_endpoint_is_not_found(self):
+        with mock.patch.object(metrics, 'ENABLED', False):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+    def test_counters_and_gauges(self):
+        headers = self.auth(self.user)
+        self.client.get('/api/auth/profile/', **headers)
+        self.client.get('/api/auth/profile/', **headers)
+
+        with mock.patch.object(metrics, 'ENABLED', True):
+            response = self.client.get('/api/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        # Монотонные счётчики — counter с суффиксом _total
+        self.assertIn('# TYPE auth_token_cache_hits_total counter\n', body)
+        self.assertIn('# TYPE auth_audit_dropped_total counter\n', body)
+        self.assertIn('# TYPE auth_password_hashing_rejected_total counter\n', body)
+        # Мгновенные значения остаются gauge
+        self.assertIn('# TYPE auth_token_cache_size gauge\n', body)
+        self.assertIn('# TYPE auth_audit_queued gauge\n', body)
+        self.assertNotIn('auth_token_cache_hits ', body)
+        self.assertRegex(body, r'\nauth_token_cache_hits_total [1-9]')
+
+    def test_rejected_scopes_are_counters(self):
+        body = metrics.render({'login_throttle': {'rejected_ip': 3}, 'activity': {'pending': 2}})
+
+        self.assertIn('# TYPE auth_login_throttle_rejected_ip_total counter\nauth_login_throttle_rejected_ip_total 3\n', body)
+        self.assertIn('# TYPE auth_activity_pending gauge\nauth_activity_pending 2\n', body)
+
+
+class TokenCacheTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tokens.clear()
+        self.addCleanup(tokens.clear)
+
+    def entry_ttl(self, token):
+        _, expires_at = tokens._verified._data[hashlib.sha256(token.encode('utf-8')).digest()]
+        return expires_at - time.monotonic()
+
+    def test_repeated_decode_skips_verification(self):
+        token = tokens.encode_token({'user_id': self.user.id, 'exp': int(time.time()) + 3600})
+        payload = decode_token(token)
+
+        with mock.patch('accounts.tokens.jwt.decode') as jwt_decode:
+            self.assertIs(decode_token(token), payload)
+        jwt_decode.assert_not_called()
+
+    def test_entry_does_not_outlive_exp(self):
+        token = tokens.encode_token({'user_id': self.user.id, 'exp': int(time.time()) + 5})
+        decode_token(token)
+
+        # TTL кэша (сутки) урезается до exp токена
+        self.assertLessEqual(self.entry_ttl(token), 5)
+
+        later = time.monotonic() + 6
+        with mock.patch('accounts.cache.time.monotonic', return_value=later):
+            self.assertIsNone(tokens._verified.get(hashlib.sha256(token.encode('utf-8')).digest()))
+
+    def test_token_without_exp_uses_cache_ttl(self):
+        token = tokens.encode_token({'user_id': self.user.id})
+        decode_token(token)
+
+        self.assertGreater(self.entry_ttl(token), tokens._verified.ttl - 5)
+
+    def test_forget_token(self):
+        token = tokens.encode_token({'user_id': self.user.id, 'exp': int(time.time()) + 3600})
+        decode_token(token)
+        tokens.forget_token(token)
+
+        with mock.patch('accounts.tokens.jwt.decode', return_value={}) as jwt_decode:
+            decode_token(token)
+        jwt_decode.assert_called_once()
+
+
+class HashingExecutorTests(ApiTestCase):
+
+    def test_saturated_pool_returns_503(self):
+        rejected = hashing.executor.rejected
+        # Все слоты пула заняты
+        with mock.patch.object(hashing.executor, '_slots', threading.Semaphore(0)):
+            response = self.client.post(
+                '/api/auth/login/', {'email': 'user@example.com', 'password': 'userpass123'},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(hashing.executor.rejected, rejected + 1)
+
+    def test_slot_is_released_after_job(self):
+        executor = hashing.HashingExecutor(workers=1, queue_size=0)
+        release = threading.Event()
+        future = executor.submit(release.wait)
+        self.addCleanup(executor._executor.shutdown)
+
+        with self.assertRaises(hashing.HashingUnavailable):
+            executor.submit(lambda: None)
+
+        release.set()
+        future.result()
+        # Колбэк освобождения слота может отработать чуть позже result()
+        for _ in range(100):
+            if executor._slots.acquire(blocking=False):
+                executor._slots.release()
+                break
+            time.sleep(0.01)
+        self.assertEqual(executor.run(lambda: 'ok'), 'ok')
+        self.assertEqual(executor.stats()['rejected'], 1)
+
+
+class AsyncViewTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        login_limits.clear()
+        self.addCleanup(login_limits.clear)
+        # Токен выпускается синхронно: ORM-обращения к роли недоступны из event loop
+        self.headers = self.auth(self.user)
+
+    async def test_login_and_profile(self):
+        response = await self.async_client.post(
+            '/api/auth/async/login/', {'email': 'user@example.com', 'password': 'userpass123'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        access = response.json()['token']
+
+        response = await self.async_client.get(
+            '/api/auth/async/profile/', headers={'Authorization': f'Bearer {access}'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], 'user@example.com')
+
+    async def test_bad_password(self):
+        response = await self.async_client.post(
+            '/api/auth/async/login/', {'email': 'user@example.com', 'password': 'wrong'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_errors_match_sync_views(self):
+        response = await self.async_client.get('/api/auth/async/profile/')
+        self.assertEqual(response.status_code, 401)
+        self.assertTrue(response.has_header('WWW-Authenticate'))
+
+        response = await self.async_client.get('/api/auth/async/login/')
+        self.assertEqual(response.status_code, 405)
+
+        response = await self.async_client.post(
+            '/api/auth/async/login/', 'not json', content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_aauthenticate(self):
+        request = RequestFactory().get('/', **self.headers)
+
+        user, token = await JWTAuthentication().aauthenticate(request)
+
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(request.jwt_payload['user_id'], self.user.id)
+        self.assertIsNone(await JWTAuthentication().aauthenticate(RequestFactory().get('/')))
+
+    async def test_aauthenticate_rejects_inactive_user(self):
+        await User.objects.filter(id=self.user.id).aupdate(is_active=False)
+        user_cache.forget(self.user.id)
+
+        with self.assertRaises(AuthenticationFailed):
+            await JWTAuthentication().aauthenticate(RequestFactory().get('/', **self.headers))
+
+
+@override_settings(DB_PRIMARY_STICKY_SECONDS=5, DB_PRIMARY_STICKY_CACHE='default')
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(db_router, 'REPLICAS', ('replica_1',))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = db_router.ReplicaRouter()
+        self.headers = {'HTTP_AUTHORIZATION': 'Bearer ' + tokens.encode_token(
+            {'user_id': 42, 'exp': int(time.time()) + 60},
+        )}
+
+    def request(self, view):
+        # Ответ через middleware; view видит маршрутизацию внутри запроса
+        middleware = db_router.ReplicaRoutingMiddleware(lambda request: HttpResponse(view()))
+        return middleware(RequestFactory().get('/', **self.headers))
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.request(lambda: self.router.db_for_read(User)).content, b'replica_1')
+
+    def test_without_replicas_routing_is_disabled(self):
+        with mock.patch.object(db_router, 'REPLICAS', ()):
+            self.assertIsNone(self.router.db_for_read(User))
+            with self.assertRaises(MiddlewareNotUsed):
+                db_router.ReplicaRoutingMiddleware(lambda request: None)
+
+    def test_read_after_write_uses_primary(self):
+        def view():
+            before = self.router.db_for_read(User)
+            self.router.db_for_write(User)
+            return f'{before},{self.router.db_for_read(User)}'
+
+        self.assertEqual(self.request(view).content, b'replica_1,default')
+
+    def test_user_sticks_to_primary_after_write(self):
+        self.request(lambda: self.router.db_for_write(User))
+
+        self.assertEqual(self.request(lambda: self.router.db_for_read(User)).content, b'default')
+
+        # Запросы без токена этого пользователя по-прежнему читают с реплики
+        self.headers = {}
+        self.assertEqual(self.request(lambda: self.router.db_for_read(User)).content, b'replica_1')
+
+    def test_atomic_block_uses_primary(self):
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertEqual(self.request(lambda: self.router.db_for_read(User)).content, b'default')
+
+    def test_no_migrations_on_replicas(self):
+        self.assertIs(self.router.allow_migrate('replica_1', 'accounts'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'accounts'))
+
+
+class AuditLogTests(ApiTestCase):
+
+    def audit_log(self, **options):
+        with override_settings(**options):
+            log = AuditLog()
+        self.addCleanup(atexit.unregister, log._flush_at_exit)
+        return log
+
+    def test_login_events_are_flushed(self):
+        log = self.audit_log()
+        with mock.patch('accounts.views.audit_log', log):
+            for password in ('userpass123', 'wrong'):
+                self.client.post(
+                    '/api/auth/login/', {'email': 'user@example.com', 'password': password},
+                    content_type='application/json',
+                )
+
+        # До сброса очереди запрос в БД не пишет
+        self.assertFalse(AuditEvent.objects.exists())
+        log.flush()
+
+        events = list(AuditEvent.objects.order_by('id').values_list('event', 'user_id', 'path'))
+        self.assertEqual(events, [
+            (LOGIN_SUCCEEDED, self.user.id, '/api/auth/login/'),
+            (LOGIN_FAILED, self.user.id, '/api/auth/login/'),
+        ])
+        self.assertEqual(log.stats(), {'queued': 0, 'written': 2, 'dropped': 0, 'failed': 0})
+
+    def test_flush_writes_in_batches(self):
+        log = self.audit_log(AUDIT_BATCH_SIZE=2)
+        with mock.patch.object(log._writer, 'wake') as wake:
+            for i in range(5):
+                log.record(LOGIN_FAILED, email=f'user{i}@example.com')
+        # Воркер будится, как только набирается пачка
+        self.assertTrue(wake.called)
+
+        with self.assertNumQueries(3):
+            log.flush()
+
+        self.assertEqual(AuditEvent.objects.count(), 5)
+        self.assertEqual(log.stats()['written'], 5)
+
+    def test_full_queue_drops_events(self):
+        log = self.audit_log(AUDIT_QUEUE_SIZE=2)
+        for i in range(5):
+            log.record(LOGIN_FAILED, email=f'user{i}@example.com')
+
+        self.assertEqual(log.stats(), {'queued': 2, 'written': 0, 'dropped': 3, 'failed': 0})
+        log.flush()
+        self.assertEqual(AuditEvent.objects.count(), 2)
+
+    def test_failed_batch_is_counted(self):
+        log = self.audit_log()
+        log.record(LOGIN_FAILED, email='user@example.com')
+
+        with mock.patch.object(AuditEvent.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                log.flush()
+
+        self.assertEqual(log.stats(), {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 1})
+
+
+class ActivityTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activity = ActivityTracker()
+        self.addCleanup(atexit.unregister, self.activity._flush_at_exit)
+
+    def test_requests_are_coalesced(self):
+        headers = self.auth(self.user)
+        with mock.patch('accounts.authentication.activity', self.activity):
+            for _ in range(3):
+                self.assertEqual(self.client.get('/api/auth/profile/', **headers).status_code, 200)
+
+        self.assertEqual(self.activity.stats(), {'pending': 1})
+        self.assertIsNone(User.objects.get(id=self.user.id).last_seen)
+
+        with self.assertNumQueries(1):
+            self.activity.flush()
+
+        user = User.objects.get(id=self.user.id)
+        self.assertIsNotNone(user.last_seen)
+        self.assertIsNone(user.last_login)
+        # bulk_update не трогает updated_at
+        self.assertEqual(user.updated_at, self.user.updated_at)
+
+    def test_touch_within_interval_is_not_requeued(self):
+        self.activity.touch(self.user.id)
+        self.activity.flush()
+        self.activity.touch(self.user.id)
+
+        self.assertEqual(self.activity.stats(), {'pending': 0})
+
+        later = time.monotonic() + self.activity.write_interval + 1
+        with mock.patch('accounts.cache.time.monotonic', return_value=later):
+            self.activity.touch(self.user.id)
+        self.assertEqual(self.activity.stats(), {'pending': 1})
+
+    def test_login_sets_last_login_and_last_seen(self):
+        self.activity.touch(self.user.id)
+        self.activity.login(self.user.id)
+        self.activity.touch(self.manager.id)
+
+        with self.assertNumQueries(2):
+            self.activity.flush()
+
+        user = User.objects.get(id=self.user.id)
+        self.assertIsNotNone(user.last_login)
+        self.assertEqual(user.last_seen, user.last_login)
+        manager = User.objects.get(id=self.manager.id)
+        self.assertIsNotNone(manager.last_seen)
+        self.assertIsNone(manager.last_login)
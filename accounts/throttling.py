@@ -0,0 +1,159 @@
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+
+class TokenBucket:
+    # Корзины токенов в памяти воркера. Ключи распределены по шардам со своими
+    # блокировками, чтобы параллельные запросы не ждали одну общую блокировку.
+    # В каждом шарде не больше max_keys / shards ключей: давно не
+    # использованные вытесняются (их корзины и так успели бы наполниться).
+
+    def __init__(self, capacity, duration, shards=16, max_keys=100000):
+        self.capacity = capacity
+        self.rate = capacity / duration
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._shard_size = max(1, max_keys // shards)
+
+    def consume(self, key):
+        # Возвращает 0, если токен списан, иначе — сколько секунд ждать
+        index = zlib.crc32(key.encode('utf-8')) % len(self._shards)
+        shard = self._shards[index]
+        now = time.monotonic()
+        with self._locks[index]:
+            tokens, updated = shard.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            shard[key] = (tokens, now)
+            if len(shard) > self._shard_size:
+                shard.popitem(last=False)
+        return wait
+
+
+class CacheWindow:
+    # Счётчик в кэше Django (фиксированное окно): общий лимит для всех
+    # воркеров при Redis/Memcached. add + incr атомарны в этих бэкендах.
+
+    def __init__(self, cache_alias, capacity, duration):
+        self.cache = caches[cache_alias]
+        self.capacity = capacity
+        self.duration = duration
+
+    def _window(self, key):
+        now = time.time()
+        window = int(now // self.duration)
+        return f'throttle:{key}:{window}', (window + 1) * self.duration - now
+
+    def consume(self, key):
+        cache_key, remaining = self._window(key)
+        self.cache.add(cache_key, 0, int(self.duration) + 1)
+        try:
+            count = self.cache.incr(cache_key)
+        except ValueError:
+            # Ключ успел истечь между add и incr
+            self.cache.set(cache_key, 1, int(self.duration) + 1)
+            count = 1
+        return 0 if count <= self.capacity else remaining
+
+    async def aconsume(self, key):
+        cache_key, remaining = self._window(key)
+        await self.cache.aadd(cache_key, 0, int(self.duration) + 1)
+        try:
+            count = await self.cache.aincr(cache_key)
+        except ValueError:
+            await self.cache.aset(cache_key, 1, int(self.duration) + 1)
+            count = 1
+        return 0 if count <= self.capacity else remaining
+
+
+def _make_limiter(rate):
+    capacity, duration = SimpleRateThrottle.parse_rate(None, rate)
+    cache_alias = getattr(settings, 'LOGIN_THROTTLE_CACHE', '')
+    if cache_alias:
+        return CacheWindow(cache_alias, capacity, duration)
+    return TokenBucket(
+        capacity, duration,
+        shards=getattr(settings, 'LOGIN_THROTTLE_SHARDS', 16),
+        max_keys=getattr(settings, 'LOGIN_THROTTLE_MAX_KEYS', 100000),
+    )
+
+
+class LoginLimits:
+    # Лимиты попыток входа по IP и по email; счётчики отказов
+    # отдаются в /api/metrics/, чтобы подбирать значения лимитов
+
+    def __init__(self):
+        self._limiters = None
+        self._lock = threading.Lock()
+        self.rejected = {'ip': 0, 'email': 0}
+
+    @property
+    def limiters(self):
+        # Создаются при первом запросе, когда настройки уже загружены
+        if self._limiters is None:
+            with self._lock:
+                if self._limiters is None:
+                    self._limiters = {
+                        'ip': _make_limiter(settings.LOGIN_THROTTLE_IP_RATE),
+                        'email': _make_limiter(settings.LOGIN_THROTTLE_EMAIL_RATE),
+                    }
+        return self._limiters
+
+    def keys(self, request, ident):
+        yield 'ip', f'login:ip:{ident}'
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if isinstance(email, str) and email:
+            yield 'email', f'login:email:{email.strip().lower()}'
+
+    def reject(self, scope, wait):
+        with self._lock:
+            self.rejected[scope] += 1
+        raise Throttled(wait=wait, detail='Слишком много попыток входа. Повторите позже.')
+
+    def check(self, request, ident):
+        for scope, key in self.keys(request, ident):
+            wait = self.limiters[scope].consume(key)
+            if wait:
+                self.reject(scope, wait)
+
+    async def acheck(self, request, ident):
+        for scope, key in self.keys(request, ident):
+            limiter = self.limiters[scope]
+            if isinstance(limiter, CacheWindow):
+                wait = await limiter.aconsume(key)
+            else:
+                wait = limiter.consume(key)
+            if wait:
+                self.reject(scope, wait)
+
+    def clear(self):
+        self._limiters = None
+
+    def stats(self):
+        return {f'rejected_{scope}': count for scope, count in self.rejected.items()}
+
+
+login_limits = LoginLimits()
+
+
+class LoginRateThrottle(BaseThrottle):
+    # Проверяется DRF до вызова представления: отклонённая попытка не
+    # доходит ни до запроса пользователя в БД, ни до bcrypt
+    def allow_request(self, request, view):
+        login_limits.check(request, self.get_ident(request))
+        return True
+
+    async def aallow_request(self, request, view):
+        await login_limits.acheck(request, self.get_ident(request))
+        return True
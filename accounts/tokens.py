@@ -0,0 +1,56 @@
+import hashlib
+import time
+
+import jwt
+from django.conf import settings
+
+from . import metrics
+from .cache import TTLCache
+
+ALGORITHM = 'HS256'
+
+# Ключ подписи читаем один раз при старте процесса, а не на каждый запрос
+SIGNING_KEY = settings.SECRET_KEY
+
+# Уже проверенные токены: sha256(token) -> payload. Запись живёт до exp токена,
+# поэтому повторный запрос с тем же токеном обходится без HMAC и разбора JSON
+_verified = TTLCache(
+    maxsize=getattr(settings, 'TOKEN_CACHE_MAX_SIZE', 50000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 24 * 60 * 60),
+)
+
+
+@metrics.instrumented('jwt_encode')
+def encode_token(payload):
+    return jwt.encode(payload, SIGNING_KEY, algorithm=ALGORITHM)
+
+
+@metrics.instrumented('jwt_decode')
+def decode_token(token):
+    # Возвращаемый payload общий для всех запросов с этим токеном — не изменять
+    digest = hashlib.sha256(token.encode('utf-8')).digest()
+    payload = _verified.get(digest)
+    if payload is not None:
+        return payload
+
+    # Ошибки jwt (просрочен, неверная подпись) пробрасываются вызывающему
+    payload = jwt.decode(token, SIGNING_KEY, algorithms=[ALGORITHM])
+
+    ttl = _verified.ttl
+    exp = payload.get('exp')
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    _verified.set(digest, payload, ttl=ttl)
+    return payload
+
+
+def forget_token(token):
+    _verified.pop(hashlib.sha256(token.encode('utf-8')).digest())
+
+
+def clear():
+    _verified.clear()
+
+
+def stats():
+    return _verified.stats()
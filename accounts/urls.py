@@ -1,12 +1,20 @@
 from django.urls import path
 
-from accounts import views
+from accounts import async_views, views
 
 urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
+    path('refresh/', views.refresh_view, name='refresh'),
     path('logout/', views.logout_view, name='logout'),
+    path('introspect/', views.introspect_view, name='introspect'),
     path('profile/', views.profile_view, name='profile'),
     path('access-rules/', views.access_rules_view, name='access-rules'),
+    path('access-rules/bulk/', views.access_rules_bulk_view, name='access-rules-bulk'),
     path('access-rules/<int:rule_id>/', views.access_rule_detail_view, name='access-rule-detail'),
+
+    # Нативные async-варианты для ASGI (uvicorn и т.п.)
+    path('async/register/', async_views.register_view, name='async-register'),
+    path('async/login/', async_views.login_view, name='async-login'),
+    path('async/profile/', async_views.profile_view, name='async-profile'),
 ]
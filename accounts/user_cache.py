@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+from .cache import TTLCache
+from .models import User
+
+
+class RoleSnapshot:
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class UserSnapshot:
+    # Минимальный слепок пользователя для request.user: всё, что нужно
+    # аутентификации и проверке прав, без загрузки полной строки User
+    __slots__ = ('id', 'is_active', 'role_id', 'role')
+
+    def __init__(self, id, is_active, role_id, role_name):
+        self.id = id
+        self.is_active = is_active
+        self.role_id = role_id
+        self.role = RoleSnapshot(role_id, role_name)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    def get_full_user(self):
+        # Полная модель нужна только там, где её читают или изменяют (профиль)
+        return User.objects.select_related('role').get(id=self.id, is_active=True)
+
+    async def aget_full_user(self):
+        return await User.objects.select_related('role').aget(id=self.id, is_active=True)
+
+    def __str__(self):
+        return f"User #{self.id}"
+
+
+_cache = TTLCache(
+    maxsize=getattr(settings, 'USER_CACHE_MAX_SIZE', 10000),
+    ttl=getattr(settings, 'USER_CACHE_TTL', 30),
+)
+
+
+def _snapshot_query(user_id):
+    # Роль подтягиваем тем же запросом
+    return (
+        User.objects.filter(id=user_id, is_active=True)
+        .values_list('id', 'is_active', 'role_id', 'role__name')
+    )
+
+
+def _remember(user_id, row):
+    if row is None:
+        return None
+    snapshot = UserSnapshot(*row)
+    _cache.set(user_id, snapshot)
+    return snapshot
+
+
+@metrics.instrumented('user_lookup')
+def get_active_user(user_id):
+    snapshot = _cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+    return _remember(user_id, _snapshot_query(user_id).first())
+
+
+async def aget_active_user(user_id):
+    snapshot = _cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+    return _remember(user_id, await _snapshot_query(user_id).afirst())
+
+
+def get_active_users(user_ids):
+    # Пакетный вариант: {id: слепок} только для активных, промахи кэша — одним запросом
+    found = {}
+    missing = []
+    for user_id in set(user_ids):
+        snapshot = _cache.get(user_id)
+        if snapshot is not None:
+            found[user_id] = snapshot
+        else:
+            missing.append(user_id)
+    if missing:
+        rows = User.objects.filter(id__in=missing, is_active=True).values_list('id', 'is_active', 'role_id', 'role__name')
+        for row in rows:
+            found[row[0]] = _remember(row[0], row)
+    return found
+
+
+def forget(user_id):
+    # Сброс без привязки к транзакции — для async-кода вне atomic()
+    _cache.pop(user_id)
+
+
+def invalidate(user_id):
+    _cache.pop(user_id)
+    # Повторно сбрасываем после коммита, чтобы параллельный запрос
+    # не успел закэшировать строку из ещё не завершённой транзакции
+    transaction.on_commit(lambda: _cache.pop(user_id))
+
+
+def clear():
+    _cache.clear()
+
+
+def stats():
+    return _cache.stats()
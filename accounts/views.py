@@ -1,13 +1,49 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from django.db import transaction
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from .models import User, Role, AccessRule
-from .serializers import UserSerializer, AccessRuleSerializer
+from . import hashing, metrics, response_cache, role_hierarchy, tokens, user_cache
+from .activity import activity
+from .access_matrix import (
+    GENERATION_NAME as ACCESS_RULES_GENERATION, PERMISSION_FIELDS, access_matrix,
+    PERM_CREATE, PERM_READ, PERM_READ_ALL, PERM_UPDATE, PERM_UPDATE_ALL, PERM_DELETE, PERM_DELETE_ALL,
+)
+from .audit import ACCESS_RULE_CHANGED, LOGIN_FAILED, LOGIN_SUCCEEDED, audit_log
+from .authentication import JWTAuthentication
+from .db_router import stick_to_primary
+from .filters import keyset_params, next_page_link, parse_id
+from .models import User, Role, AccessRule, CacheGeneration
+from .refresh_tokens import InvalidRefreshToken, revoke_refresh_token, rotate_refresh_token, token_pair
+from .revocation import revocations
+from .serializers import UserSerializer, AccessRuleSerializer, AccessRuleBulkSerializer
+from .throttling import LoginRateThrottle, login_limits
+
+ACCESS_RULES_PAGE_SIZE = 100
+ACCESS_RULES_MAX_PAGE_SIZE = 1000
+AUTHZ_CHECK_MAX_ITEMS = 1000
+
+# Проверяемые действия и биты маски: (для своих объектов, для всех)
+AUTHZ_ACTIONS = {
+    'create': (PERM_CREATE, PERM_CREATE),
+    'read': (PERM_READ, PERM_READ_ALL),
+    'update': (PERM_UPDATE, PERM_UPDATE_ALL),
+    'delete': (PERM_DELETE, PERM_DELETE_ALL),
+}
 
 # Create your views here.
 @api_view(['POST'])
+@metrics.instrumented('register_view')
 def register_view(request):
     # Получаем данные из тела запроса
     data = request.data
@@ -40,14 +76,17 @@ def register_view(request):
     )
     user.set_password(password)  
     user.save() 
+    # Новый пользователь может ещё не дойти до реплик
+    stick_to_primary(user.id)
+    activity.login(user.id)
 
-    # Генерируем JWT-токен для нового пользователя
-    token = user.generate_jwt()
-
-    return Response({'token': token}, status=status.HTTP_201_CREATED)
+    # Генерируем пару access/refresh-токенов для нового пользователя
+    return Response(token_pair(user), status=status.HTTP_201_CREATED)
 
 # --- Вход пользовавтеля ---
 @api_view(['POST'])
+@throttle_classes([LoginRateThrottle])
+@metrics.instrumented('login_view')
 def login_view(request):
     # Получаем email и password из тела запроса
     email = request.data.get('email')
@@ -55,24 +94,106 @@ def login_view(request):
 
     # Проверяем, существует ли пользователь с таким email и он активен
     try:
-        user = User.objects.get(email=email, is_active=True)
+        user = User.objects.select_related('role').get(email=email, is_active=True)
     except User.DoesNotExist:
         # Если пользователя нет или он неактивен, возвращаем 401
+        audit_log.record(LOGIN_FAILED, request, email=email, reason='unknown_user')
         return Response({'error': 'Неверный email или пароль'}, status=status.HTTP_401_UNAUTHORIZED)
 
     # Проверяем, совпадает ли введённый пароль с хешем в БД
     if not user.check_password(password):
+        audit_log.record(LOGIN_FAILED, request, user_id=user.id, email=email, reason='bad_password')
         return Response({'error': 'Неверный email или пароль'}, status=status.HTTP_401_UNAUTHORIZED)
 
-    # Генерируем JWT-токен
-    token = user.generate_jwt()
-    # Возвращаем токен с кодом 200 (OK)
-    return Response({'token': token}, status=status.HTTP_200_OK)
+    audit_log.record(LOGIN_SUCCEEDED, request, user_id=user.id, email=email)
+    activity.login(user.id)
+
+    # Генерируем короткоживущий access-токен и refresh-токен
+    # Возвращаем их с кодом 200 (OK)
+    return Response(token_pair(user), status=status.HTTP_200_OK)
+
+# --- Обновление токенов ---
+@api_view(['POST'])
+@authentication_classes([])
+def refresh_view(request):
+    # Просроченный access-токен в заголовке не должен мешать обновлению,
+    # поэтому аутентификация здесь отключена
+    refresh = request.data.get('refresh') if isinstance(request.data, dict) else None
+    if not refresh:
+        return Response({'error': 'Поле refresh обязательно'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(refresh, str):
+        return Response({'error': 'Поле refresh должно быть строкой'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Старый refresh-токен становится недействительным, выдаётся новая пара
+    try:
+        tokens = rotate_refresh_token(refresh)
+    except InvalidRefreshToken as exc:
+        return Response({'error': exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(tokens, status=status.HTTP_200_OK)
+
+# --- Интроспекция токена для других сервисов ---
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def introspect_view(request):
+    # Сервисы проверяют токен здесь, не храня SECRET_KEY. Ответ собирается
+    # из тех же кэшей проверенных токенов и пользователей, что и у JWTAuthentication.
+    # Как требует RFC 7662, вызывающий аутентифицирован — своим токеном сервисной
+    # роли (TOKEN_INTROSPECTION_ROLES), иначе любой мог бы перебирать токены
+    if request.user.role.name not in settings.TOKEN_INTROSPECTION_ROLES:
+        return Response({'error': 'Нет прав'}, status=status.HTTP_403_FORBIDDEN)
+
+    token = request.data.get('token')
+    if not token:
+        return Response({'error': 'Поле token обязательно'}, status=status.HTTP_400_BAD_REQUEST)
+
+    authenticator = JWTAuthentication()
+    try:
+        payload = authenticator.get_payload(str(token))
+    except AuthenticationFailed:
+        payload = None
+    user = None
+    if payload is not None and not revocations.is_revoked(payload.get('jti')):
+        user = authenticator.user_from_claims(payload) or user_cache.get_active_user(payload['user_id'])
+
+    if user is None:
+        response = Response({'active': False})
+        add_never_cache_headers(response)
+        return response
+
+    response = Response({
+        'active': True,
+        'user_id': user.id,
+        'role': user.role_id,
+        'role_name': user.role.name,
+        'exp': payload['exp'],
+        'iat': payload.get('iat'),
+        'jti': payload.get('jti'),
+    })
+    # Ответ можно кэшировать до истечения токена, но не дольше, чем
+    # отзыв или деактивация доходят до всех воркеров
+    remaining = int(payload['exp'] - time.time())
+    patch_cache_control(response, private=True, max_age=max(0, min(remaining, settings.TOKEN_INTROSPECTION_MAX_AGE)))
+    return response
+
 
 # --- Выход пользователя ---
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
+    refresh = request.data.get('refresh') if isinstance(request.data, dict) else None
+    if refresh is not None and not isinstance(refresh, str):
+        return Response({'error': 'Поле refresh должно быть строкой'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Отзываем текущий access-токен до истечения его срока; payload уже
+    # проверен при аутентификации
+    payload = request.jwt_payload
+    if payload.get('jti'):
+        revocations.revoke(payload['jti'], payload['exp'])
+
+    # Если клиент передал refresh-токен, отзываем и всю его цепочку
+    if refresh:
+        revoke_refresh_token(refresh)
+
     return Response({'message': 'Вы успешно вышли'}, status=status.HTTP_200_OK)
 
 
@@ -80,8 +201,11 @@ def logout_view(request):
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def profile_view(request):
-    # request.user — это объект User
-    user = request.user 
+    # request.user — облегчённый слепок из кэша, для профиля загружаем полную модель
+    try:
+        user = request.user.get_full_user()
+    except User.DoesNotExist:
+        return Response({'error': 'Пользователь не найден'}, status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'GET':
         # Возвращаем данные пользователя в JSON
@@ -94,6 +218,7 @@ def profile_view(request):
         user.last_name = request.data.get('last_name', user.last_name)
         user.patronymic = request.data.get('patronymic', user.patronymic)
         user.save()
+        user_cache.invalidate(user.id)
         # Возвращаем обновлённые данные
         return Response(UserSerializer(user).data)
 
@@ -101,6 +226,7 @@ def profile_view(request):
         # Мягкое удаление is_active=False
         user.is_active = False
         user.save()
+        user_cache.invalidate(user.id)
         return Response({'message': 'Аккаунт удален'}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -113,10 +239,7 @@ def access_rules_view(request):
         return Response({'error': 'Нет прав'}, status=status.HTTP_403_FORBIDDEN)
 
     if request.method == 'GET':
-        # Возвращаем список всех прав доступа
-        rules = AccessRule.objects.all()
-        serializer = AccessRuleSerializer(rules, many=True)
-        return Response(serializer.data)
+        return _access_rules_list(request)
 
     elif request.method == 'POST':
         # Создаём новое правило доступа
@@ -129,13 +252,88 @@ def access_rules_view(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _access_rules_list(request):
+    # Поколение правил меняется при любом изменении правил, ролей и элементов,
+    # поэтому ETag из поколения и параметров запроса позволяет ответить 304,
+    # не обращаясь к таблице правил
+    generation = CacheGeneration.current(ACCESS_RULES_GENERATION)
+    query = urlencode(sorted(request.query_params.items()))
+    etag = quote_etag(f"{generation}-{hashlib.sha1(query.encode('utf-8')).hexdigest()[:16]}")
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+    try:
+        limit, after = keyset_params(request, ACCESS_RULES_PAGE_SIZE, ACCESS_RULES_MAX_PAGE_SIZE)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Keyset-пагинация по id: страница — это диапазон индекса, без OFFSET
+    rules = AccessRule.objects.select_related('role', 'business_element').filter(id__gt=after)
+    role = request.query_params.get('role')
+    element = request.query_params.get('business_element')
+    try:
+        if role:
+            rules = rules.filter(role_id=parse_id(role)) if role.isdigit() else rules.filter(role__name=role)
+        if element:
+            rules = (
+                rules.filter(business_element_id=parse_id(element)) if element.isdigit()
+                else rules.filter(business_element__name=element)
+            )
+    except ValueError:
+        return Response({'error': 'Слишком большой id в фильтре'}, status=status.HTTP_400_BAD_REQUEST)
+    # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+    page = list(rules.order_by('id')[:limit + 1])
+
+    response = Response(AccessRuleSerializer(page[:limit], many=True).data)
+    response['ETag'] = etag
+    if len(page) > limit:
+        response['Link'] = next_page_link(request, page[limit - 1].id, limit)
+    return response
+
+
+# --- Пакетное изменение правил доступа (только для админа) ---
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def access_rules_bulk_view(request):
+    if request.user.role.name != 'admin':
+        return Response({'error': 'Нет прав'}, status=status.HTTP_403_FORBIDDEN)
+
+    serializer = AccessRuleBulkSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    plan = serializer.validated_data
+
+    # Весь пакет применяется атомарно, таблица прав сбрасывается один раз.
+    # Удаление — первым: пакет может удалить правило и создать заново ту же
+    # пару (роль, элемент), не нарушая уникальности
+    with transaction.atomic(), access_matrix.batch(), role_hierarchy.batch():
+        deleted = 0
+        if plan['delete']:
+            deleted, _ = AccessRule.objects.filter(id__in=plan['delete']).delete()
+        if plan['update']:
+            AccessRule.objects.bulk_update(plan['update'], PERMISSION_FIELDS)
+        created = AccessRule.objects.bulk_create(plan['create'])
+        # bulk_create и bulk_update не вызывают сигналы
+        role_hierarchy.rules_changed((rule.role_id, rule.business_element_id) for rule in created + plan['update'])
+        if created or plan['update'] or deleted:
+            access_matrix.notify_changed()
+
+    return Response({
+        'created': AccessRuleSerializer(created, many=True).data,
+        'updated': len(plan['update']),
+        'deleted': deleted,
+    }, status=status.HTTP_200_OK)
+
+
 # --- Конкретное правило доступа (только для админа) ---
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def access_rule_detail_view(request, rule_id):
     # Пытаемся найти правило доступа по ID
     try:
-        rule = AccessRule.objects.get(id=rule_id)
+        rule = AccessRule.objects.select_related('role', 'business_element').get(id=rule_id)
     except AccessRule.DoesNotExist:
         return Response({'error': 'Правило не найдено'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -155,10 +353,109 @@ def access_rule_detail_view(request, rule_id):
         serializer = AccessRuleSerializer(rule, data=request.data, partial=partial)
         if serializer.is_valid():
             serializer.save()
+            audit_log.record(
+                ACCESS_RULE_CHANGED, request, user_id=request.user.id,
+                rule_id=rule.id, action='update', rule=serializer.data,
+            )
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
+        deleted = AccessRuleSerializer(rule).data
         rule.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT) 
-    
+        audit_log.record(
+            ACCESS_RULE_CHANGED, request, user_id=request.user.id,
+            rule_id=rule_id, action='delete', rule=deleted,
+        )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# --- Пакетная проверка прав для других сервисов ---
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def authz_check_view(request):
+    # Вызывать могут только сервисные роли (AUTHZ_CHECK_ROLES)
+    if request.user.role.name not in settings.AUTHZ_CHECK_ROLES:
+        return Response({'error': 'Нет прав'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Тело запроса может быть и JSON-массивом — тогда полей нет вовсе
+    checks = request.data.get('checks') if isinstance(request.data, dict) else None
+    if not isinstance(checks, list) or not all(isinstance(check, dict) for check in checks):
+        return Response({'error': 'Поле checks должно быть списком объектов'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(checks) > AUTHZ_CHECK_MAX_ITEMS:
+        return Response(
+            {'error': f'Не больше {AUTHZ_CHECK_MAX_ITEMS} проверок за запрос'}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Сначала определяем субъекты всех проверок, затем пользователей без
+    # роли в токене загружаем одним запросом (или из кэша аутентификации)
+    subjects = [_authz_subject(check) for check in checks]
+    users = user_cache.get_active_users(
+        subject for subject in subjects if isinstance(subject, int)
+    )
+
+    results = []
+    for check, subject in zip(checks, subjects):
+        if isinstance(subject, int):
+            subject = users.get(subject, 'inactive_user')
+        if isinstance(subject, str):
+            results.append({'allowed': False, 'error': subject})
+            continue
+        results.append(_authz_decision(subject.role_id, check.get('element'), check.get('action')))
+    return Response({'results': results})
+
+
+def _authz_subject(check):
+    # Слепок пользователя, id пользователя для загрузки из БД или код ошибки
+    token = check.get('token')
+    if token is not None:
+        authenticator = JWTAuthentication()
+        try:
+            payload = authenticator.get_payload(str(token))
+        except AuthenticationFailed:
+            return 'invalid_token'
+        if revocations.is_revoked(payload.get('jti')):
+            return 'revoked_token'
+        return authenticator.user_from_claims(payload) or payload['user_id']
+
+    user_id = check.get('user_id')
+    if isinstance(user_id, int) and not isinstance(user_id, bool):
+        return user_id
+    return 'user_or_token_required'
+
+
+def _authz_decision(role_id, element, action):
+    # Те же данные, что у AccessPermission: таблица прав в памяти, без запросов.
+    # Не-строки (списки, объекты) не могут быть ключами — это ошибка элемента проверки
+    bits = AUTHZ_ACTIONS.get(action) if isinstance(action, str) else None
+    if bits is None:
+        return {'allowed': False, 'error': 'unknown_action'}
+    if not isinstance(element, str) or not access_matrix.has_element(element):
+        return {'allowed': False, 'error': 'unknown_element'}
+    rule = access_matrix.get(role_id, element)
+    mask = rule.mask if rule is not None else 0
+    own_bit, all_bit = bits
+    if mask & all_bit:
+        return {'allowed': True, 'scope': 'all'}
+    if mask & own_bit:
+        return {'allowed': True, 'scope': 'own'}
+    return {'allowed': False}
+
+
+# --- Метрики в формате Prometheus ---
+def metrics_view(request):
+    # Обычное Django-представление: метрики отдаются без аутентификации,
+    # доступ к эндпоинту ограничивается на уровне сети
+    if not metrics.ENABLED:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+
+    body = metrics.render({
+        'token_cache': tokens.stats(),
+        'user_cache': user_cache.stats(),
+        'password_hashing': hashing.executor.stats(),
+        'login_throttle': login_limits.stats(),
+        'response_cache': response_cache.stats(),
+        'audit': audit_log.stats(),
+        'activity': activity.stats(),
+    })
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
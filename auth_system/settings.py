@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.MetricsMiddleware',
+    'accounts.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,9 +90,32 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),         
         'HOST': os.getenv('DB_HOST'),         
         'PORT': os.getenv('DB_PORT'), 
+        # Постоянные соединения и проверка их живости перед повторным использованием
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'False') == 'True',
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS="host1,host2:5433".
+# Остальные параметры подключения берутся из основной БД
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    _host, _, _port = _host.strip().partition(':')
+    _alias = f'replica_{_index}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'CONN_MAX_AGE': int(os.getenv('DB_REPLICA_CONN_MAX_AGE', DATABASES['default']['CONN_MAX_AGE'])),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_REPLICA_CONN_HEALTH_CHECKS', str(DATABASES['default']['CONN_HEALTH_CHECKS'])
+        ) == 'True',
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['accounts.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,4 +163,95 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'accounts.authentication.JWTAuthentication', 
     ],
+    # Число доверенных прокси перед приложением. При 0 IP клиента для
+    # ограничения попыток входа — REMOTE_ADDR; заголовок X-Forwarded-For
+    # учитывается только за столько прокси, сколько указано
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
 }
+
+# Как часто (в секундах) воркер сверяет свою таблицу прав с поколением в БД
+ACCESS_MATRIX_CHECK_INTERVAL = float(os.getenv('ACCESS_MATRIX_CHECK_INTERVAL', 5))
+
+# Кэш аутентифицированных пользователей в памяти воркера. TTL ограничивает,
+# сколько деактивированный в другом воркере аккаунт может сохранять доступ
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 10000))
+
+# Кэш проверенных JWT: запись живёт не дольше exp токена и TOKEN_CACHE_TTL
+TOKEN_CACHE_MAX_SIZE = int(os.getenv('TOKEN_CACHE_MAX_SIZE', 50000))
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', 24 * 60 * 60))
+
+# Пул для bcrypt: число потоков и сколько задач может ждать в очереди,
+# прежде чем запросы начнут получать 503
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASHING_QUEUE_SIZE = int(os.getenv('PASSWORD_HASHING_QUEUE_SIZE', 4 * PASSWORD_HASHING_WORKERS))
+
+# Встраивать в JWT роль, маски прав и поколение правил (самодостаточные токены)
+JWT_EMBED_PERMISSIONS = os.getenv('JWT_EMBED_PERMISSIONS', 'False') == 'True'
+# Предельная длина упакованных масок в токене (base64, символов; байт на
+# бизнес-элемент). При большем числе элементов маски не встраиваются
+JWT_PERMISSIONS_MAX_LENGTH = int(os.getenv('JWT_PERMISSIONS_MAX_LENGTH', 1024))
+
+# Время жизни access- и refresh-токенов, в секундах
+JWT_ACCESS_TTL = int(os.getenv('JWT_ACCESS_TTL', 15 * 60))
+JWT_REFRESH_TTL = int(os.getenv('JWT_REFRESH_TTL', 30 * 24 * 60 * 60))
+# Как часто (в секундах) удаляются истёкшие refresh-токены
+REFRESH_TOKEN_PURGE_INTERVAL = float(os.getenv('REFRESH_TOKEN_PURGE_INTERVAL', 60 * 60))
+# Доверять роли из access-токена без проверки пользователя в БД;
+# окно отзыва при этом ограничено JWT_ACCESS_TTL
+JWT_STATELESS_ACCESS = os.getenv('JWT_STATELESS_ACCESS', 'False') == 'True'
+
+# Отзыв токенов при выходе: как часто воркер сверяет свой набор отозванных jti
+# с БД и как часто удаляются записи об истёкших токенах (секунды)
+REVOCATION_CHECK_INTERVAL = float(os.getenv('REVOCATION_CHECK_INTERVAL', 5))
+REVOCATION_PURGE_INTERVAL = float(os.getenv('REVOCATION_PURGE_INTERVAL', 60 * 60))
+
+# Замеры этапов горячего пути и SQL на запрос, эндпоинт /api/metrics/
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+
+# После записи запросы пользователя читают с основной БД столько секунд,
+# чтобы не получить устаревшие данные из реплики. Окна хранятся в кэше
+# Django DB_PRIMARY_STICKY_CACHE: для нескольких серверов нужен общий бэкенд
+DB_PRIMARY_STICKY_SECONDS = float(os.getenv('DB_PRIMARY_STICKY_SECONDS', 5))
+DB_PRIMARY_STICKY_CACHE = os.getenv('DB_PRIMARY_STICKY_CACHE', 'default')
+
+# Ограничение попыток входа по IP и по email (формат DRF: число/sec|min|hour|day).
+# Без LOGIN_THROTTLE_CACHE счётчики — корзины токенов в памяти воркера;
+# с алиасом кэша Django лимит общий для всех воркеров
+LOGIN_THROTTLE_IP_RATE = os.getenv('LOGIN_THROTTLE_IP_RATE', '30/min')
+LOGIN_THROTTLE_EMAIL_RATE = os.getenv('LOGIN_THROTTLE_EMAIL_RATE', '10/min')
+LOGIN_THROTTLE_CACHE = os.getenv('LOGIN_THROTTLE_CACHE', '')
+
+# Кэш ответов списков mock_app: время жизни и размер записи в памяти воркера,
+# как часто сверяются поколения данных, изменённые другими воркерами
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 30))
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv('RESPONSE_CACHE_MAX_SIZE', 10000))
+RESPONSE_CACHE_CHECK_INTERVAL = float(os.getenv('RESPONSE_CACHE_CHECK_INTERVAL', 2))
+
+# Роли, которым доступен /api/authz/check/ (через запятую)
+AUTHZ_CHECK_ROLES = [role for role in os.getenv('AUTHZ_CHECK_ROLES', 'admin').split(',') if role]
+
+# Максимальный max-age ответа интроспекции токена: не дольше, чем отзыв
+# доходит до всех воркеров
+TOKEN_INTROSPECTION_MAX_AGE = int(os.getenv('TOKEN_INTROSPECTION_MAX_AGE', REVOCATION_CHECK_INTERVAL))
+
+# Роли, которым доступна интроспекция токенов /api/auth/introspect/
+# (через запятую); по умолчанию те же, что у /api/authz/check/
+TOKEN_INTROSPECTION_ROLES = [
+    role for role in os.getenv('TOKEN_INTROSPECTION_ROLES', ','.join(AUTHZ_CHECK_ROLES)).split(',') if role
+]
+
+# Журнал аудита: размер очереди в памяти воркера (сверх него события
+# отбрасываются), размер пачки bulk_create и интервал сброса в секундах
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 500))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 2))
+
+# last_login / last_seen: строка пользователя обновляется не чаще раза в
+# ACTIVITY_WRITE_INTERVAL секунд, накопленные отметки сохраняются пачкой
+# раз в ACTIVITY_FLUSH_INTERVAL секунд
+ACTIVITY_WRITE_INTERVAL = float(os.getenv('ACTIVITY_WRITE_INTERVAL', 5 * 60))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 60))
+# Отметок в одном UPDATE и размер памяти недавних отметок на воркер
+ACTIVITY_BATCH_SIZE = int(os.getenv('ACTIVITY_BATCH_SIZE', 1000))
+ACTIVITY_MAX_USERS = int(os.getenv('ACTIVITY_MAX_USERS', 100000))
@@ -0,0 +1,42 @@
+"""
+Профиль для боевого развёртывания API: DJANGO_SETTINGS_MODULE=auth_system.settings_production
+
+API аутентифицирует запросы только через JWTAuthentication, поэтому здесь
+отключено всё, что нужно лишь для сессий и HTML: contrib-приложения
+(auth, contenttypes, sessions, messages, staticfiles), их middleware,
+шаблоны и browsable API. Сравнение с обычными настройками:
+python manage.py bench_settings
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import REST_FRAMEWORK
+
+# DEBUG=False также отключает накопление SQL в connection.queries
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
+
+INSTALLED_APPS = [
+    'rest_framework',
+    'accounts',
+    'mock_app',
+]
+
+MIDDLEWARE = [
+    'accounts.middleware.MetricsMiddleware',
+    'accounts.db_router.ReplicaRoutingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+]
+
+# Шаблоны нужны только browsable API, который здесь не подключается
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': ['rest_framework.parsers.JSONParser'],
+    # Без django.contrib.auth: неаутентифицированный request.user — None
+    'UNAUTHENTICATED_USER': None,
+    'UNAUTHENTICATED_TOKEN': None,
+}
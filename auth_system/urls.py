@@ -17,8 +17,12 @@ Including another URLconf
 # from django.contrib import admin
 from django.urls import include, path
 
+from accounts.views import authz_check_view, metrics_view
+
 urlpatterns = [
     # path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),  
     path('api/', include('mock_app.urls')),
+    path('api/authz/check/', authz_check_view, name='authz-check'),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
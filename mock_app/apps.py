@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MockAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mock_app'
+
+    def ready(self):
+        # Подключаем обработчики сигналов инвалидации кэша ответов
+        from . import signals  # noqa: F401
@@ -1,3 +1,25 @@
 from django.db import models
 
+# Поколения данных для кэша ответов (accounts.response_cache)
+PRODUCTS_GENERATION = 'data:products'
+ORDERS_GENERATION = 'data:orders'
+
 # Create your models here.
+class Product(models.Model):
+    name = models.CharField(max_length=200)
+    # Индекс по owner нужен для выборки «только свои» (read_permission без read_all)
+    owner = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='products', db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Страница «только своих» по keyset-курсору: owner_id = %s AND id > %s ORDER BY id
+        indexes = [models.Index(fields=['owner', 'id'])]
+
+
+class Order(models.Model):
+    status = models.CharField(max_length=20, default='pending')
+    owner = models.ForeignKey('accounts.User', on_delete=models.CASCADE, related_name='orders', db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['owner', 'id'])]
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.response_cache import data_generations
+from .models import ORDERS_GENERATION, PRODUCTS_GENERATION, Order, Product
+
+
+# Изменение товаров или заказов сбрасывает закэшированные списки
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def products_changed(sender, **kwargs):
+    data_generations.bump(PRODUCTS_GENERATION)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def orders_changed(sender, **kwargs):
+    data_generations.bump(ORDERS_GENERATION)
@@ -1,3 +1,105 @@
-from django.test import TestCase
+from accounts.models import User
+from accounts.tests import ApiTestCase
 
-# Create your tests here.
+from .models import Order, Product
+
+
+class ProductListTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.bulk_create(Product(name=f'Product {i}', owner=self.user) for i in range(5))
+        Product.objects.create(name='Foreign', owner=self.admin)
+
+    def test_pages_follow_link(self):
+        response = self.client.get('/api/products/?limit=2', **self.auth(self.user))
+        self.assertEqual([row['name'] for row in response.json()], ['Product 0', 'Product 1'])
+
+        names = []
+        url = '/api/products/?limit=2'
+        while url:
+            response = self.client.get(url, **self.auth(self.user))
+            self.assertEqual(response.status_code, 200)
+            names += [row['name'] for row in response.json()]
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+
+        # Без read_all — только свои товары
+        self.assertEqual(names, [f'Product {i}' for i in range(5)])
+
+    def test_cached_page_keeps_link(self):
+        first = self.client.get('/api/products/?limit=2', **self.auth(self.user))
+        second = self.client.get('/api/products/?limit=2', **self.auth(self.user))
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Link'], first['Link'])
+
+    def test_invalid_page_params(self):
+        for query in ('limit=abc', 'after=x', 'limit=0'):
+            response = self.client.get(f'/api/products/?{query}', **self.auth(self.user))
+            self.assertEqual(response.status_code, 400, query)
+
+
+class OrderUpdateTests(ApiTestCase):
+
+    def test_non_integer_id_is_bad_request(self):
+        for method in ('put', 'delete'):
+            for order_id in ('abc', [1], True, {}):
+                response = getattr(self.client, method)(
+                    '/api/orders/', {'id': order_id, 'status': 'done'},
+                    content_type='application/json', **self.auth(self.admin),
+                )
+                self.assertEqual(response.status_code, 400, (method, order_id))
+
+    def test_update_is_scoped_and_invalidates_list(self):
+        order = Order.objects.create(owner=self.user)
+        self.assertEqual(self.client.get('/api/orders/', **self.auth(self.manager)).json()[0]['status'], 'pending')
+
+        response = self.client.put(
+            '/api/orders/', {'id': str(order.id), 'status': 'shipped'},
+            content_type='application/json', **self.auth(self.manager),
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/orders/', **self.auth(self.manager)).json()[0]['status'], 'shipped')
+
+
+class AllowedActionsTests(ApiTestCase):
+
+    def actions(self, user, url):
+        response = self.client.get(url, **self.auth(user))
+        self.assertEqual(response.status_code, 200)
+        return {row['owner_id']: row['allowed_actions'] for row in response.json()}
+
+    def test_actions_follow_role_rule(self):
+        Order.objects.create(owner=self.user)
+        Order.objects.create(owner=self.manager)
+
+        # Права *_all действуют на любые заказы
+        self.assertEqual(
+            self.actions(self.manager, '/api/orders/'),
+            {self.user.id: ['read', 'update'], self.manager.id: ['read', 'update']},
+        )
+        self.assertEqual(
+            self.actions(self.admin, '/api/orders/'),
+            {self.user.id: ['read', 'update', 'delete'], self.manager.id: ['read', 'update', 'delete']},
+        )
+        # Без read_all пользователь видит только свои заказы
+        self.assertEqual(self.actions(self.user, '/api/orders/'), {self.user.id: ['read']})
+
+    def test_own_and_foreign_objects_differ(self):
+        rule = self.rule('user', 'products')
+        rule.read_all_permission = True
+        rule.update_permission = True
+        rule.save()
+        other = User.objects.create(email='other@example.com', first_name='Other', role=self.user.role)
+        Product.objects.create(name='Mine', owner=self.user)
+        Product.objects.create(name='Theirs', owner=other)
+
+        expected = {self.user.id: ['read', 'update'], other.id: ['read']}
+        self.assertEqual(self.actions(self.user, '/api/products/'), expected)
+        # Ответ кэшируется по пользователю: у другого владельца свой набор действий
+        self.assertEqual(
+            self.actions(other, '/api/products/'),
+            {self.user.id: ['read'], other.id: ['read', 'update']},
+        )
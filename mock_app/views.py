@@ -1,30 +1,53 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
+from accounts.filters import keyset_params, next_page_link, scope_to_owner
+from accounts.response_cache import cache_list_response, data_generations
 from accounts.permissions import (
     AccessPermissionForProducts,
     AccessPermissionForOrders,
+    annotate_allowed_actions,
 )
+from .models import ORDERS_GENERATION, PRODUCTS_GENERATION, Product, Order
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def _list_page(request, queryset, fields):
+    # Keyset-пагинация по id (limit, after), как у списка правил доступа:
+    # с условием по владельцу страница читается по индексу (owner_id, id)
+    try:
+        limit, after = keyset_params(request, PAGE_SIZE, MAX_PAGE_SIZE)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    # Берём на одну строку больше, чтобы узнать, есть ли следующая страница
+    rows = list(queryset.filter(id__gt=after).order_by('id').values(*fields)[:limit + 1])
+    # Для каждой строки — какие действия с ней доступны пользователю
+    response = Response(annotate_allowed_actions(request, rows[:limit]))
+    if len(rows) > limit:
+        response['Link'] = next_page_link(request, rows[limit - 1]['id'], limit)
+    return response
+
+
+def _parse_id(value):
+    # id из тела запроса: целое число или строка из цифр
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
 
 @api_view(['GET', 'POST'])
 @permission_classes([AccessPermissionForProducts]) 
+@cache_list_response('products', PRODUCTS_GENERATION)
 def products_view(request):
     # Обработка GET-запроса: возвращаем список товаров
     if request.method == 'GET':
-        # Если у пользователя есть право 'read_all_permission', показываем все товары
-        if request.user_role_rule and request.user_role_rule.read_all_permission:
-            # Возвращаем "все" товары (mock-данные)
-            data = [
-                {"id": 1, "name": "Товар 1", "owner_id": 123},
-                {"id": 2, "name": "Товар 2", "owner_id": 456}
-            ]
-        else:
-            # Иначе — возвращаем только "свои" товары
-            # owner_id совпадает с id текущего пользователя
-            data = [
-                {"id": 1, "name": "Товар 1", "owner_id": request.user.id}
-            ]
-        return Response(data)
+        # С правом 'read_all_permission' — все товары, иначе только свои:
+        # условие по owner_id добавляется в SQL-запрос
+        products = scope_to_owner(request, Product.objects.all())
+        return _list_page(request, products, ('id', 'name', 'owner_id'))
 
     # Обработка POST-запроса: создание нового товара
     elif request.method == 'POST':
@@ -37,31 +60,50 @@ def products_view(request):
                 {"error": "Поле 'name' обязательно для создания товара."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        # Создаём mock-объект товара
+        # Создаём товар, владелец — текущий пользователь
+        product = Product.objects.create(name=name, owner_id=request.user.id)
         new_product = {
-            "id": 999, 
-            "name": name, 
-            "owner_id": request.user.id
+            "id": product.id, 
+            "name": product.name, 
+            "owner_id": product.owner_id
         }
         return Response(new_product, status=status.HTTP_201_CREATED)
 
 
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AccessPermissionForOrders]) 
+@cache_list_response('orders', ORDERS_GENERATION)
 def orders_view(request):
+    # Выборка ограничена владельцем, если у роли нет права *_all для этого метода
+    orders = scope_to_owner(request, Order.objects.all())
+
     # Обработка GET-запроса: возвращаем список заказов
     if request.method == 'GET':
-        data = [
-            {"id": 1, "status": "paid", "owner_id": request.user.id},
-            {"id": 2, "status": "pending", "owner_id": request.user.id}
-        ]
-        return Response(data)
+        return _list_page(request, orders, ('id', 'status', 'owner_id'))
+
+    # Изменяемый или удаляемый заказ передаётся полем id
+    if request.data.get('id') is None:
+        return Response({"error": "Поле 'id' обязательно."}, status=status.HTTP_400_BAD_REQUEST)
+    order_id = _parse_id(request.data.get('id'))
+    if order_id is None:
+        return Response({"error": "Поле 'id' должно быть целым числом."}, status=status.HTTP_400_BAD_REQUEST)
 
     # Обработка PUT-запроса: обновление заказа
-    elif request.method == 'PUT':
-        updated_order = {"id": 1, "status": "shipped", "owner_id": request.user.id}
+    if request.method == 'PUT':
+        new_status = request.data.get('status')
+        if not new_status:
+            return Response({"error": "Поле 'status' обязательно."}, status=status.HTTP_400_BAD_REQUEST)
+        # Один UPDATE ... WHERE id = %s [AND owner_id = %s]: чужой заказ просто не найдётся
+        if not orders.filter(id=order_id).update(status=new_status):
+            return Response({"error": "Заказ не найден"}, status=status.HTTP_404_NOT_FOUND)
+        # update() не отправляет сигналов — сбрасываем кэш списков явно
+        data_generations.bump(ORDERS_GENERATION)
+        updated_order = orders.filter(id=order_id).values('id', 'status', 'owner_id').first()
         return Response(updated_order)
 
     # Обработка DELETE-запроса: удаление заказа
     elif request.method == 'DELETE':
-        return Response({"message": "Заказ удален"}, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        deleted, _ = orders.filter(id=order_id).delete()
+        if not deleted:
+            return Response({"error": "Заказ не найден"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Заказ удален"}, status=status.HTTP_204_NO_CONTENT)